@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+
+from aiohttp import web
+
+from main import GSIT, SOURCES
+
+# Each scale is the number of distinct hosts a domain has across all sources
+DEFAULT_SCALES = "100,10k,1M"
+REPORT_FORMATS = ('json', 'ndjson', 'csv', 'html')
+
+
+def parse_scale(text: str) -> int:
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def scale_label(count: int) -> str:
+    if count >= 1000000 and count % 1000000 == 0:
+        return f"{count // 1000000}M"
+    if count >= 1000 and count % 1000 == 0:
+        return f"{count // 1000}k"
+    return str(count)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+class ReplayServer:
+    # Serves synthetic (or recorded) responses for every GSIT source so
+    # scans can be benchmarked without touching the real services
+    def __init__(self, hosts: int, fixtures: Optional[str] = None, latency: float = 0.0,
+                 error_rate: float = 0.0, slow_sources: Optional[List[str]] = None,
+                 slow_latency: float = 2.0):
+        self.hosts = hosts
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_sources = set(slow_sources or [])
+        self.slow_latency = slow_latency
+        self.random = random.Random(0)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/search', self.bing)
+        app.router.add_get('/', self.crtsh)
+        app.router.add_get('/hostsearch/', self.hackertarget)
+        app.router.add_get('/anubis/subdomains/{domain}', self.anubis)
+        return app
+
+    def names(self, domain: str, count: int) -> Iterator[str]:
+        for i in range(count):
+            yield f"h{i}.{domain}"
+
+    def fixture(self, name: str, domain: str) -> Optional[bytes]:
+        # Recorded responses may use {domain} where the scanned domain goes
+        if not self.fixtures:
+            return None
+        path = os.path.join(self.fixtures, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read().replace(b'{domain}', domain.encode())
+
+    async def delay(self, source: str) -> Optional[web.Response]:
+        latency = self.slow_latency if source in self.slow_sources else self.latency
+        if latency:
+            await asyncio.sleep(latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return web.Response(status=503, text="replayed failure")
+        return None
+
+    async def bing(self, request: web.Request) -> web.StreamResponse:
+        failure = await self.delay('bing')
+        if failure:
+            return failure
+        domain = request.query.get('q', '').replace('site:', '')
+        body = self.fixture('bing.html', domain)
+        if body is None:
+            first = int(request.query.get('first', 1)) - 1
+            count = max(0, min(int(request.query.get('count', 50)), self.hosts - first))
+            links = ''.join(f'<li><a href="https://h{i}.{domain}/page">h{i}.{domain}</a></li>'
+                            for i in range(first, first + count))
+            body = f"<html><body><ol>{links}</ol></body></html>".encode()
+        return web.Response(body=body, content_type='text/html')
+
+    async def crtsh(self, request: web.Request) -> web.StreamResponse:
+        failure = await self.delay('crtsh')
+        if failure:
+            return failure
+        domain = request.query.get('q', '').replace('%.', '')
+        body = self.fixture('crtsh.json', domain)
+        if body is not None:
+            return web.Response(body=body, content_type='application/json')
+
+        # Large payloads are generated while streaming, like the real service
+        response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        await response.prepare(request)
+        await response.write(b'[')
+        separator = b''
+        batch = []
+        for i, name in enumerate(self.names(domain, self.hosts)):
+            variant = name.upper() if i % 7 == 0 else name
+            batch.append(json.dumps({
+                'issuer_ca_id': 16418,
+                'issuer_name': 'C=US, O=Let\'s Encrypt, CN=R3',
+                'common_name': name,
+                'name_value': f"{variant}\n*.{name}",
+                'id': 1000000 + i,
+                'entry_timestamp': '2024-01-01T00:00:00.000',
+                'not_before': '2024-01-01T00:00:00',
+                'not_after': '2024-04-01T00:00:00',
+                'serial_number': f"{i:032x}"
+            }))
+            if len(batch) == 1000:
+                await response.write(separator + ','.join(batch).encode())
+                separator = b','
+                batch = []
+        if batch:
+            await response.write(separator + ','.join(batch).encode())
+        await response.write(b']')
+        await response.write_eof()
+        return response
+
+    async def hackertarget(self, request: web.Request) -> web.StreamResponse:
+        failure = await self.delay('hackertarget')
+        if failure:
+            return failure
+        domain = request.query.get('q', '')
+        body = self.fixture('hackertarget.txt', domain)
+        if body is None:
+            body = '\n'.join(f"{name},10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+                             for i, name in enumerate(self.names(domain, max(self.hosts // 10, 1)))).encode()
+        return web.Response(body=body, content_type='text/plain')
+
+    async def anubis(self, request: web.Request) -> web.StreamResponse:
+        failure = await self.delay('anubis')
+        if failure:
+            return failure
+        domain = request.match_info['domain']
+        body = self.fixture('anubis.json', domain)
+        if body is None:
+            body = json.dumps(list(self.names(domain, max(self.hosts // 2, 1)))).encode()
+        return web.Response(body=body, content_type='application/json')
+
+
+async def run_scale(args: argparse.Namespace) -> Dict:
+    # Runs in a fresh child process so peak RSS belongs to this scale only
+    if not args.rate_limits:
+        for spec in SOURCES.values():
+            spec.rate = 0
+            spec.backoff = 0.05
+
+    gsit = GSIT()
+    gsit.limit = args.bing_limit
+    gsit.concurrency = args.concurrency
+    gsit.page_size = args.page_size
+    gsit.parse_workers = args.parse_workers
+    gsit.parse_mode = args.parse_mode
+    gsit.endpoints = {name: args.base_url for name in SOURCES}
+    sources = [s.strip() for s in args.engines.split(',')]
+    domains = [f"bench{i}.example" for i in range(args.domains)]
+
+    start = time.perf_counter()
+    async with gsit:
+        await gsit.run_batch(domains, sources)
+    search_seconds = time.perf_counter() - start
+
+    hosts = sum(len(gsit.results_for(domain)['hosts']) for domain in domains)
+    report_seconds = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for format in REPORT_FORMATS:
+            start = time.perf_counter()
+            for domain in domains:
+                gsit.generate_report(format, os.path.join(workdir, f"{domain}.{format}"), domain=domain)
+            report_seconds[format] = round(time.perf_counter() - start, 4)
+
+    summary = gsit.metrics.summary()['sources']
+    return {
+        'scale': args.scale,
+        'domains': args.domains,
+        'hosts': hosts,
+        'search_seconds': round(search_seconds, 4),
+        'domains_per_sec': round(args.domains / search_seconds, 3) if search_seconds else 0,
+        'hosts_per_sec': round(hosts / search_seconds, 1) if search_seconds else 0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'report_seconds': report_seconds,
+        'sources': {
+            name: {
+                'search_seconds': m['search']['seconds'],
+                'fetch_seconds': m['fetch']['seconds'],
+                'parse_seconds': m['parse_seconds'],
+                'bytes_received': m['bytes_received'],
+                'retries': m['retries'],
+                'errors': sum(m['errors'].values())
+            }
+            for name, m in summary.items()
+        }
+    }
+
+
+async def run_benchmarks(args: argparse.Namespace) -> List[Dict]:
+    results = []
+    for scale in [parse_scale(s) for s in args.scales.split(',')]:
+        server = ReplayServer(scale, args.fixtures, args.latency, args.error_rate,
+                              [s for s in args.slow.split(',') if s], args.slow_latency)
+        runner = web.AppRunner(server.app())
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            result_file = f.name
+        print(f"[*] Benchmarking {scale_label(scale)} hosts x {args.domains} domains")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), '--child',
+                '--scale', str(scale), '--base-url', f"http://127.0.0.1:{port}",
+                '--result-file', result_file, '--domains', str(args.domains),
+                '--engines', args.engines, '--bing-limit', str(args.bing_limit),
+                '--concurrency', str(args.concurrency), '--page-size', str(args.page_size),
+                '--parse-workers', str(args.parse_workers), '--parse-mode', args.parse_mode,
+                *(['--rate-limits'] if args.rate_limits else []),
+                stdout=asyncio.subprocess.DEVNULL
+            )
+            if await process.wait() != 0:
+                print(f"[-] Benchmark at {scale_label(scale)} hosts failed")
+                continue
+            with open(result_file) as f:
+                results.append(json.load(f))
+        finally:
+            os.remove(result_file)
+            await runner.cleanup()
+    return results
+
+
+def print_results(results: List[Dict]) -> None:
+    print(f"{'scale':>6} {'hosts':>10} {'search s':>9} {'domains/s':>10} {'hosts/s':>11} "
+          f"{'peak MB':>8}  report s ({'/'.join(REPORT_FORMATS)})")
+    for r in results:
+        reports = '/'.join(f"{r['report_seconds'][f]:.2f}" for f in REPORT_FORMATS)
+        print(f"{scale_label(r['scale']):>6} {r['hosts']:>10} {r['search_seconds']:>9.2f} "
+              f"{r['domains_per_sec']:>10.2f} {r['hosts_per_sec']:>11.0f} {r['peak_rss_mb']:>8.1f}  {reports}")
+        for name, m in sorted(r['sources'].items()):
+            print(f"{'':>6} {name:<12} search {m['search_seconds']:.2f}s fetch {m['fetch_seconds']:.2f}s "
+                  f"parse {m['parse_seconds']:.2f}s {m['bytes_received'] / (1 << 20):.1f} MB "
+                  f"retries {m['retries']} errors {m['errors']}")
+
+
+def compare(results: List[Dict], baseline_file: str, tolerance: float) -> bool:
+    with open(baseline_file) as f:
+        baseline = {r['scale']: r for r in json.load(f)['results']}
+    ok = True
+    for r in results:
+        base = baseline.get(r['scale'])
+        if base is None:
+            continue
+        label = scale_label(r['scale'])
+        if r['domains_per_sec'] < base['domains_per_sec'] * (1 - tolerance):
+            print(f"[-] {label}: domains/sec fell from {base['domains_per_sec']} to {r['domains_per_sec']}")
+            ok = False
+        if r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            print(f"[-] {label}: peak RSS grew from {base['peak_rss_mb']} MB to {r['peak_rss_mb']} MB")
+            ok = False
+    if ok:
+        print(f"[+] No regressions against {baseline_file} (tolerance {tolerance:.0%})")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GSIT offline benchmark against a local replay server")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help=f"Comma-separated hosts per domain (default: {DEFAULT_SCALES})")
+    parser.add_argument("--domains", type=int, default=1,
+                        help="Domains scanned per scale (default: 1)")
+    parser.add_argument("-b", "--engines", default="bing,crtsh,hackertarget,anubis",
+                        help="Comma-separated list of sources to benchmark")
+    parser.add_argument("--bing-limit", type=int, default=50,
+                        help="Bing result count per domain (default: 50)")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="Domains scanned at once (default: 20)")
+    parser.add_argument("--page-size", type=int, default=10000,
+                        help="HTML host table page size (default: 10000)")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="Parse worker pool size passed to GSIT (default: 0)")
+    parser.add_argument("--parse-mode", choices=["process", "thread"], default="process",
+                        help="Parse worker pool type (default: process)")
+    parser.add_argument("--fixtures",
+                        help="Directory of recorded responses (bing.html, crtsh.json, "
+                             "hackertarget.txt, anubis.json) to replay instead of synthetic data")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds of latency added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of responses replaced with HTTP 503")
+    parser.add_argument("--slow", default="",
+                        help="Comma-separated sources that respond slowly")
+    parser.add_argument("--slow-latency", type=float, default=2.0,
+                        help="Latency of --slow sources in seconds (default: 2)")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="Keep the production per-source rate limits and backoff")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Fail if results regress against this earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed regression against --baseline (default: 0.2)")
+    # Internal: a single scale run inside a child process
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = asyncio.run(run_scale(args))
+        with open(args.result_file, 'w') as f:
+            json.dump(result, f)
+        return
+
+    results = asyncio.run(run_benchmarks(args))
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, f, indent=2)
+        print(f"[+] Benchmark results written: {args.output}")
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,553 +1,3716 @@
 import argparse
+import array
 import asyncio
+import bisect
+import concurrent.futures
+import contextvars
+import csv
+import errno
+import functools
+import hashlib
+import heapq
+import io
+import ipaddress
+import itertools
 import json
+import multiprocessing
 import os
+import re
 import sys
+import tempfile
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import random
+import socket
+import sqlite3
+import struct
+import time
+import urllib.parse
+from html import unescape
 
 import aiohttp
-import pandas as pd
-from bs4 import BeautifulSoup
-from jinja2 import Template
 
-class GSIT:
+# jinja2 is imported by the code path that needs it so runs that never
+# render an HTML report start faster
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+
+def accept_encoding() -> str:
+    # aiohttp only decodes brotli when a brotli binding is installed
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+        except ImportError:
+            return 'gzip, deflate'
+    return 'gzip, deflate, br'
+
+HOST_RE = re.compile(r'^[a-z0-9_-]+(?:\.[a-z0-9_-]+)*$')
+
+
+def normalize_host(raw: str) -> Optional[str]:
+    # Reduces URLs, wildcards and mixed-case variants to one canonical name
+    host = raw.strip().lower()
+    if '://' in host:
+        host = host.split('://', 1)[1]
+    for sep in ('/', '?', '#'):
+        host = host.split(sep, 1)[0]
+    host = host.rpartition('@')[2]
+    if host.startswith('['):
+        return None
+    host = host.split(':', 1)[0]
+    while host.startswith('*.'):
+        host = host[2:]
+    host = host.strip('.')
+    if not host.isascii():
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            return None
+    if len(host) > 253 or not HOST_RE.match(host):
+        return None
+    return host
+
+
+def normalize_domain(raw: str) -> Optional[str]:
+    # A scan target: a host name, possibly written as a bare URL; anything
+    # with a path, query or credentials is refused rather than trimmed
+    target = raw.strip()
+    if '://' in target:
+        target = target.split('://', 1)[1]
+    target = target.rstrip('/')
+    if any(c in target for c in '/?#@'):
+        return None
+    host = normalize_host(target)
+    if host is None or '.' not in host:
+        return None
+    return host
+
+
+BING_PAGE_SIZE = 50
+
+IPV4_OCTET = rb'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+
+# Bytes that can be part of a host name, email, or IPv4/IPv6 address; every
+# other byte separates tokens
+TOKEN_BYTES = b'abcdefghijklmnopqrstuvwxyz0123456789_.%+@*:-'
+TOKEN_TABLE = bytes(b if b in TOKEN_BYTES else 32 for b in range(256))
+DIGITS = b'0123456789'
+
+
+@functools.lru_cache(maxsize=256)
+def entity_patterns(domain: str) -> Tuple["re.Pattern[bytes]", "re.Pattern[bytes]"]:
+    # The first pattern recognises the common token that is exactly one
+    # in-scope host name. The second finds everything else in a token:
+    # in-scope host names (optionally "*." prefixed or as the domain part
+    # of an email), IPv4 and IPv6 addresses. Its lookarounds stop matches
+    # from starting or ending inside a longer name.
+    suffix = re.escape(domain.encode('ascii'))
+    return re.compile(rb'(?:[a-z0-9_-]{1,63}\.)*' + suffix), re.compile(
+        rb'(?<![\w.%+-])(?:(?P<local>[\w.%+-]{1,64})@|(?:\*\.)+)?'
+        rb'(?P<host>(?:[a-z0-9_-]{1,63}\.)*' + suffix + rb')(?![\w-]|\.[\w-])'
+        rb'|(?<![\w.])(?P<ipv4>(?:' + IPV4_OCTET + rb'\.){3}' + IPV4_OCTET + rb')(?![\w]|\.[0-9])'
+        rb'|(?<![\w:.])(?P<ipv6>(?:[0-9a-f]{0,4}:){2,7}[0-9a-f]{0,4})(?![\w:.])'
+    )
+
+
+def new_entities() -> Dict[str, Dict[str, None]]:
+    # Insertion-ordered sets of found values per kind
+    return {'host': {}, 'email': {}, 'ip': {}}
+
+
+def scan_entities(data: bytes, domain: str, found: Dict[str, Dict[str, None]]) -> int:
+    # Adds every host, email and IP in data to found and returns the number
+    # of rejected names. Lowercasing, splitting into tokens and dropping
+    # repeated tokens all run in C over the raw bytes; only distinct tokens
+    # that can hold an entity reach the regexes, so large bodies are never
+    # decoded to str.
+    if b'\\' in data:
+        # "a.example.com\nb.example.com" inside a JSON string
+        data = data.replace(b'\\n', b' ').replace(b'\\r', b' ').replace(b'\\t', b' ')
+    needle = domain.encode('ascii')
+    plain_host, pattern = entity_patterns(domain)
+    hosts, emails, ips = found['host'], found['email'], found['ip']
+    invalid = 0
+    for token in dict.fromkeys(data.lower().translate(TOKEN_TABLE).split()):
+        if needle in token:
+            if len(token) <= 253 and plain_host.fullmatch(token):
+                hosts[token.decode('ascii')] = None
+                continue
+        elif b':' not in token and not (b'.' in token and token[0] in DIGITS):
+            continue
+        for match in pattern.finditer(token):
+            host = match.group('host')
+            if host is not None:
+                if len(host) > 253:
+                    invalid += 1
+                    continue
+                host = host.decode('ascii')
+                local = match.group('local')
+                if local:
+                    emails[f"{local.decode('ascii')}@{host}"] = None
+                hosts[host] = None
+            elif match.group('ipv4'):
+                ips[match.group('ipv4').decode('ascii')] = None
+            else:
+                try:
+                    ip = socket.inet_ntop(socket.AF_INET6,
+                                          socket.inet_pton(socket.AF_INET6, match.group('ipv6').decode('ascii')))
+                except (OSError, ValueError):
+                    continue
+                if ip != '::':
+                    ips[ip] = None
+    return invalid
+
+
+def pack_entities(found: Dict[str, Dict[str, None]], invalid: int) -> Tuple[str, str, str, int]:
+    return '\n'.join(found['host']), '\n'.join(found['email']), '\n'.join(found['ip']), invalid
+
+
+def extract_entities(data: bytes, domain: str) -> Tuple[str, str, str, int]:
+    # Returns newline-joined hosts, emails and IPs, each deduplicated, plus
+    # the number of rejected names
+    found = new_entities()
+    invalid = scan_entities(data, domain, found)
+    return pack_entities(found, invalid)
+
+
+def in_scope(host: str, domain: str) -> bool:
+    return host == domain or host.endswith('.' + domain)
+
+
+class HostIndex:
+    # Set of canonical host names stored as reversed labels
+    # ("www.example.com" -> "com.example.www"). A sorted view of the keys,
+    # rebuilt only after changes, answers subtree queries with two bisects;
+    # it holds references to the same key strings, one pointer per host.
+    def __init__(self, hosts: Iterable[str] = ()):
+        self.keys = set()
+        self.sorted_keys: Optional[List[str]] = None
+        self.update(hosts)
+
+    @staticmethod
+    def reverse(host: str) -> str:
+        return '.'.join(reversed(host.split('.')))
+
+    def add(self, raw: str) -> bool:
+        host = normalize_host(raw)
+        if host is None:
+            return False
+        return self.add_normalized(host)
+
+    def add_normalized(self, host: str) -> bool:
+        key = self.reverse(host)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        self.sorted_keys = None
+        return True
+
+    def update(self, hosts: Iterable[str]) -> None:
+        if isinstance(hosts, HostIndex):
+            self.keys |= hosts.keys
+            self.sorted_keys = None
+            return
+        for host in hosts:
+            self.add(host)
+
+    def discard(self, raw: str) -> None:
+        host = normalize_host(raw)
+        if host is not None and self.reverse(host) in self.keys:
+            self.keys.discard(self.reverse(host))
+            self.sorted_keys = None
+
+    def __contains__(self, raw: str) -> bool:
+        host = normalize_host(raw)
+        return host is not None and self.reverse(host) in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.keys:
+            yield self.reverse(key)
+
+    def sorted(self) -> List[str]:
+        if self.sorted_keys is None:
+            self.sorted_keys = sorted(self.keys)
+        return self.sorted_keys
+
+    def under(self, suffix: str) -> Iterator[str]:
+        # All hosts equal to or below suffix, e.g. under('x.example.com')
+        suffix = normalize_host(suffix)
+        if suffix is None:
+            return
+        key = self.reverse(suffix)
+        keys = self.sorted()
+        if key in self.keys:
+            yield suffix
+        # Children sort between "key." and "key/" since '/' follows '.'
+        start = bisect.bisect_left(keys, key + '.')
+        end = bisect.bisect_left(keys, key + '/')
+        for i in range(start, end):
+            yield self.reverse(keys[i])
+
+    def classify(self, domain: str) -> Tuple[int, int]:
+        # (in scope, out of scope) counts from the same two bisects
+        suffix = normalize_host(domain)
+        if suffix is None:
+            return 0, len(self)
+        key = self.reverse(suffix)
+        keys = self.sorted()
+        inside = bisect.bisect_left(keys, key + '/') - bisect.bisect_left(keys, key + '.') + (key in self.keys)
+        return inside, len(self) - inside
+
+
+# Entity kinds and the directed edges the graph records
+GRAPH_KINDS = ('source', 'host', 'ip', 'email')
+GRAPH_EDGES = (('source', 'host'), ('source', 'ip'), ('source', 'email'), ('host', 'ip'))
+
+
+class EntityGraph:
+    # Which source found which entity and which host resolves to which IP.
+    # Entities are interned to dense integer ids per kind and each edge type
+    # is a pair of parallel uint32 arrays, 8 bytes per edge. Neighbour
+    # lookups go through CSR indexes (offsets + targets) built on first use
+    # in either direction and dropped when edges are added.
+    # Sources report the same entity over and over (every page, every
+    # mention), so a source edge is only stored the first time; a bitmap
+    # per (source, target kind) remembers which targets are linked.
+    def __init__(self):
+        self.ids: Dict[str, Dict[str, int]] = {kind: {} for kind in GRAPH_KINDS}
+        self.values: Dict[str, List[str]] = {kind: [] for kind in GRAPH_KINDS}
+        self.edges: Dict[Tuple[str, str], Tuple[array.array, array.array]] = {
+            edge: (array.array('I'), array.array('I')) for edge in GRAPH_EDGES
+        }
+        self.indexes: Dict[Tuple[str, str], Tuple[array.array, array.array]] = {}
+        self.sourced: Dict[Tuple[int, str], bytearray] = {}
+
+    def intern(self, kind: str, value: str) -> int:
+        ids = self.ids[kind]
+        node = ids.get(value)
+        if node is None:
+            node = ids[value] = len(ids)
+            self.values[kind].append(value)
+        return node
+
+    def linked(self, source: int, to_kind: str, node: int) -> bool:
+        # Whether source already links to node; marks it linked either way
+        bits = self.sourced.get((source, to_kind))
+        if bits is None:
+            bits = self.sourced[(source, to_kind)] = bytearray()
+        byte, mask = node >> 3, 1 << (node & 7)
+        if byte >= len(bits):
+            bits.extend(bytes(max(byte + 1, 2 * len(bits)) - len(bits)))
+        if bits[byte] & mask:
+            return True
+        bits[byte] |= mask
+        return False
+
+    def link(self, from_kind: str, a: str, to_kind: str, b: str) -> None:
+        node, end = self.intern(from_kind, a), self.intern(to_kind, b)
+        if from_kind == 'source' and self.linked(node, to_kind, end):
+            return
+        sources, targets = self.edges[(from_kind, to_kind)]
+        sources.append(node)
+        targets.append(end)
+        if self.indexes:
+            self.indexes = {}
+
+    def link_many(self, from_kind: str, a: str, to_kind: str, values: Iterable[str]) -> None:
+        node = self.intern(from_kind, a)
+        sources, targets = self.edges[(from_kind, to_kind)]
+        intern = self.intern
+        if from_kind == 'source':
+            linked = self.linked
+            ends = [end for end in map(functools.partial(intern, to_kind), values)
+                    if not linked(node, to_kind, end)]
+        else:
+            ends = [intern(to_kind, value) for value in values]
+        if not ends:
+            return
+        sources.extend(itertools.repeat(node, len(ends)))
+        targets.extend(ends)
+        if self.indexes:
+            self.indexes = {}
+
+    def update(self, other: "EntityGraph") -> None:
+        for (from_kind, to_kind), (sources, targets) in other.edges.items():
+            from_values, to_values = other.values[from_kind], other.values[to_kind]
+            for a, b in zip(sources, targets):
+                self.link(from_kind, from_values[a], to_kind, to_values[b])
+
+    def index(self, from_kind: str, to_kind: str) -> Tuple[array.array, array.array]:
+        # Counting sort of the edge list by origin; works against the
+        # stored direction when (to_kind, from_kind) is the recorded edge
+        key = (from_kind, to_kind)
+        if key not in self.indexes:
+            if key in self.edges:
+                origins, ends = self.edges[key]
+            else:
+                ends, origins = self.edges[(to_kind, from_kind)]
+            offsets = array.array('I', bytes(4 * (len(self.values[from_kind]) + 1)))
+            for node in origins:
+                offsets[node + 1] += 1
+            offsets = array.array('I', itertools.accumulate(offsets))
+            targets = array.array('I', bytes(4 * len(ends)))
+            slots = offsets[:-1]
+            for node, end in zip(origins, ends):
+                targets[slots[node]] = end
+                slots[node] += 1
+            self.indexes[key] = (offsets, targets)
+        return self.indexes[key]
+
+    def neighbours(self, from_kind: str, value: str, to_kind: str) -> List[str]:
+        node = self.ids[from_kind].get(value)
+        if node is None:
+            return []
+        offsets, targets = self.index(from_kind, to_kind)
+        values = self.values[to_kind]
+        return [values[end] for end in dict.fromkeys(targets[offsets[node]:offsets[node + 1]])]
+
+    def shared(self, kind: str = 'ip', by: str = 'host', minimum: int = 2) -> Iterator[Tuple[str, List[str]]]:
+        # Entities of `kind` linked to at least `minimum` distinct `by`
+        # entities, e.g. IPs that several hosts resolve to
+        offsets, targets = self.index(kind, by)
+        values, by_values = self.values[kind], self.values[by]
+        for node, value in enumerate(values):
+            start, end = offsets[node], offsets[node + 1]
+            if end - start >= minimum:
+                linked = dict.fromkeys(targets[start:end])
+                if len(linked) >= minimum:
+                    yield value, [by_values[other] for other in linked]
+
+
+DNS_A = 1
+DNS_CNAME = 5
+DNS_AAAA = 28
+
+
+def system_nameservers() -> List[str]:
+    nameservers = []
+    try:
+        with open('/etc/resolv.conf') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    nameservers.append(parts[1])
+    except OSError:
+        pass
+    return nameservers or ['1.1.1.1', '8.8.8.8']
+
+
+def parse_nameserver(spec: str) -> Tuple[str, int]:
+    # "1.1.1.1", "127.0.0.1:5353" or "[::1]:5353"
+    if spec.startswith('['):
+        host, _, port = spec[1:].partition(']:')
+        return host.rstrip(']'), int(port or 53)
+    if spec.count(':') == 1:
+        host, port = spec.split(':')
+        return host, int(port)
+    return spec, 53
+
+
+def encode_dns_query(qid: int, name: str, qtype: int) -> bytes:
+    question = b''.join(
+        bytes([len(label)]) + label.encode('ascii') for label in name.split('.') if label
+    )
+    return struct.pack('>HHHHHH', qid, 0x0100, 1, 0, 0, 0) + question + b'\0' + struct.pack('>HH', qtype, 1)
+
+
+def read_dns_name(message: bytes, offset: int) -> Tuple[str, int]:
+    labels = []
+    end = None
+    for _ in range(128):
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+        elif length == 0:
+            offset += 1
+            break
+        else:
+            labels.append(message[offset + 1:offset + 1 + length].decode('ascii', 'replace'))
+            offset += 1 + length
+    else:
+        raise ValueError("DNS name compression loop")
+    return '.'.join(labels).lower(), end if end is not None else offset
+
+
+def parse_dns_response(message: bytes) -> Tuple[int, List[Tuple[str, int, int, str]]]:
+    # Returns the rcode and the (name, type, ttl, value) answer records
+    _, flags, qdcount, ancount, _, _ = struct.unpack('>HHHHHH', message[:12])
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = read_dns_name(message, offset)
+        offset += 4
+    answers = []
+    for _ in range(ancount):
+        name, offset = read_dns_name(message, offset)
+        rtype, _, ttl, length = struct.unpack('>HHIH', message[offset:offset + 10])
+        offset += 10
+        if rtype == DNS_A and length == 4:
+            answers.append((name, rtype, ttl, socket.inet_ntop(socket.AF_INET, message[offset:offset + 4])))
+        elif rtype == DNS_AAAA and length == 16:
+            answers.append((name, rtype, ttl, socket.inet_ntop(socket.AF_INET6, message[offset:offset + 16])))
+        elif rtype == DNS_CNAME:
+            answers.append((name, rtype, ttl, read_dns_name(message, offset)[0]))
+        offset += length
+    return flags & 0x000F, answers
+
+
+class DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) >= 12:
+            future = self.pending.pop(int.from_bytes(data[:2], 'big'), None)
+            if future is not None and not future.done():
+                future.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+
+class DNSResolver:
+    # Minimal asyncio stub resolver: UDP queries to the configured
+    # nameservers, multiplexed by query id, with a TTL-respecting cache
+    def __init__(self, nameservers: Optional[List[str]] = None, concurrency: int = 500,
+                 timeout: float = 2.0, retries: int = 2, negative_ttl: int = 60):
+        self.nameservers = [parse_nameserver(ns) for ns in (nameservers or system_nameservers())]
+        self.concurrency = concurrency
+        # Shared by every domain being scanned, so a batch of them still
+        # has at most `concurrency` lookups in flight; created on first use
+        # because shard workers configure before their loop starts
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.timeout = timeout
+        self.retries = retries
+        self.negative_ttl = negative_ttl
+        self.cache: Dict[Tuple[str, int], Tuple[float, List[Tuple[str, int, int, str]]]] = {}
+        self.protocols: List[DNSProtocol] = []
+        self.wildcards: Dict[str, asyncio.Task] = {}
+        self.next_server = 0
+        # Set while the endpoints are being opened; every lookup that starts
+        # meanwhile waits on it instead of opening sockets of its own
+        self.opening: Optional[asyncio.Future] = None
+
+    async def open(self) -> None:
+        if self.protocols:
+            return
+        if self.opening is None:
+            self.opening = asyncio.ensure_future(self.open_endpoints())
+        try:
+            await asyncio.shield(self.opening)
+        finally:
+            if self.opening is not None and self.opening.done():
+                self.opening = None
+
+    async def open_endpoints(self) -> None:
+        loop = asyncio.get_running_loop()
+        protocols = []
+        try:
+            for host, port in self.nameservers:
+                transport, protocol = await loop.create_datagram_endpoint(DNSProtocol, remote_addr=(host, port))
+                protocols.append(protocol)
+                # Hundreds of answers can land at once; don't let the kernel drop them
+                try:
+                    transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                except OSError:
+                    pass
+        except BaseException:
+            for protocol in protocols:
+                protocol.transport.close()
+            raise
+        self.protocols = protocols
+
+    def close(self) -> None:
+        for protocol in self.protocols:
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self.protocols = []
+        self.wildcards = {}
+        self.opening = None
+
+    def prune(self) -> None:
+        # Drops expired answers and finished wildcard probes; long-running
+        # processes call this between scans so the cache doesn't only grow
+        now = time.monotonic()
+        self.cache = {key: entry for key, entry in self.cache.items() if entry[0] > now}
+        self.wildcards = {parent: task for parent, task in self.wildcards.items() if not task.done()}
+
+    async def query(self, name: str, qtype: int) -> List[Tuple[str, int, int, str]]:
+        cached = self.cache.get((name, qtype))
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        await self.open()
+        loop = asyncio.get_running_loop()
+        for _ in range(self.retries + 1):
+            protocol = self.protocols[self.next_server % len(self.protocols)]
+            self.next_server += 1
+            qid = random.getrandbits(16)
+            while qid in protocol.pending:
+                qid = random.getrandbits(16)
+            future = loop.create_future()
+            protocol.pending[qid] = future
+            protocol.transport.sendto(encode_dns_query(qid, name, qtype))
+            try:
+                rcode, answers = parse_dns_response(await asyncio.wait_for(future, self.timeout))
+            except (asyncio.TimeoutError, ValueError, struct.error, IndexError):
+                continue
+            finally:
+                protocol.pending.pop(qid, None)
+            if rcode not in (0, 3):
+                continue
+            ttl = min((answer[2] for answer in answers), default=self.negative_ttl)
+            self.cache[(name, qtype)] = (time.monotonic() + ttl, answers)
+            return answers
+        return []
+
+    async def resolve(self, host: str) -> Tuple[List[str], List[str]]:
+        # Returns (addresses, cname chain) for A and AAAA lookups of host
+        ips: List[str] = []
+        cnames: List[str] = []
+        for answers in await asyncio.gather(self.query(host, DNS_A), self.query(host, DNS_AAAA)):
+            for _, rtype, _, value in answers:
+                if rtype == DNS_CNAME:
+                    if value not in cnames:
+                        cnames.append(value)
+                elif value not in ips:
+                    ips.append(value)
+        return ips, cnames
+
+    async def wildcard_ips(self, parent: str) -> frozenset:
+        # A random label that resolves means parent has wildcard DNS
+        if parent not in self.wildcards:
+            probe = f"gsit-{random.getrandbits(48):012x}.{parent}"
+            self.wildcards[parent] = asyncio.ensure_future(self.resolve(probe))
+        ips, _ = await self.wildcards[parent]
+        return frozenset(ips)
+
+    async def resolve_into(self, host: str, domain: str, results: Dict) -> List[str]:
+        # Returns the addresses recorded for host; wildcard matches are
+        # recorded separately and return nothing
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.concurrency)
+        async with self.slots:
+            ips, cnames = await self.resolve(host)
+        if not ips:
+            return []
+        parent = host.partition('.')[2]
+        if parent and in_scope(parent, domain) and set(ips) <= await self.wildcard_ips(parent):
+            results['wildcards'].add(host)
+            return []
+        results['dns'][host] = ips
+        results['ips'].update(ips)
+        results['graph'].link_many('host', host, 'ip', ips)
+        if cnames:
+            results['cnames'][host] = cnames
+        return ips
+
+
+# Liveness probing: ports tried in order, the fields recorded per host, and
+# how much of an HTML body is read looking for its <title>
+PROBE_PORTS = ((443, 'https'), (80, 'http'))
+PROBE_FIELDS = ('state', 'url', 'code', 'title', 'redirect', 'time')
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title', re.IGNORECASE | re.DOTALL)
+TITLE_BYTES = 32 << 10
+
+
+def parse_probe_ports(spec: str) -> Tuple[Tuple[int, str], ...]:
+    # "443,80" or "8443/https,8080/http"; 443 and 8443 default to https
+    ports = []
+    for item in spec.split(','):
+        port, _, scheme = item.strip().partition('/')
+        if port:
+            ports.append((int(port), scheme or ('https' if port in ('443', '8443') else 'http')))
+    return tuple(ports)
+
+
+class ProbeResolver(aiohttp.abc.AbstractResolver):
+    # Hands the probe session the addresses the DNS stage already found so
+    # hosts aren't resolved twice; anything else uses aiohttp's resolver
+    def __init__(self, addresses: Dict[str, List[str]]):
+        self.addresses = addresses
+        self.fallback: Optional[aiohttp.abc.AbstractResolver] = None
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Dict]:
+        ips = self.addresses.get(host)
+        if not ips:
+            if self.fallback is None:
+                self.fallback = aiohttp.DefaultResolver()
+            return await self.fallback.resolve(host, port, family)
+        return [{'hostname': host, 'host': ip, 'port': port,
+                 'family': socket.AF_INET6 if ':' in ip else socket.AF_INET,
+                 'proto': 0, 'flags': socket.AI_NUMERICHOST} for ip in ips]
+
+    async def close(self) -> None:
+        if self.fallback is not None:
+            await self.fallback.close()
+
+
+# Errors meaning this process is out of file descriptors, and how often a
+# probe connect retries them before giving up on the scan
+FD_ERRNOS = (errno.EMFILE, errno.ENFILE)
+FD_RETRIES = 4
+
+
+def raise_fd_limit(needed: int) -> int:
+    # Raises the soft open-file limit towards needed, as far as the hard
+    # limit allows, and returns the limit now in effect
+    try:
+        import resource
+    except ImportError:
+        return needed
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return needed
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+
+class HostProber:
+    # Checks discovered hosts with a TCP connect to each probe port, then an
+    # HTTP HEAD on the first open one (plus a short GET for HTML titles) over
+    # one keep-alive session. Connect timeouts follow an average of observed
+    # connect times, so dead hosts on a fast network are given up on quickly.
+    # Answers (state, url, code, title, redirect, time in ms), state being
+    # active (HTTP answered), open (only TCP answered) or inactive.
+    def __init__(self, concurrency: int = 200, timeout: float = 5.0, min_timeout: float = 1.0,
+                 ports: Tuple[Tuple[int, str], ...] = PROBE_PORTS, user_agent: str = ''):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.ports = ports
+        self.user_agent = user_agent
+        self.latency: Optional[float] = None
+        self.addresses: Dict[str, List[str]] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Shared by every domain being scanned: at most `concurrency` hosts
+        # are probed at once, so at most concurrency * len(ports) raw
+        # connects are open, which the session's connector limit doesn't see
+        self.slots: Optional[asyncio.Semaphore] = None
+
+    async def open(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=len(self.ports),
+                ssl=False,
+                resolver=ProbeResolver(self.addresses)
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'User-Agent': self.user_agent} if self.user_agent else None,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def connect_timeout(self) -> float:
+        if self.latency is None:
+            return self.timeout
+        return min(self.timeout, max(self.min_timeout, 4 * self.latency))
+
+    async def connect(self, address: str, port: int) -> Optional[float]:
+        # Running out of file descriptors says nothing about the host, so it
+        # is retried and finally raised instead of reported as a closed port
+        for attempt in range(FD_RETRIES + 1):
+            start = time.monotonic()
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(address, port),
+                                                   self.connect_timeout())
+                break
+            except asyncio.TimeoutError:
+                return None
+            except OSError as e:
+                if e.errno not in FD_ERRNOS:
+                    return None
+                if attempt == FD_RETRIES:
+                    raise
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        elapsed = time.monotonic() - start
+        self.latency = elapsed if self.latency is None else 0.9 * self.latency + 0.1 * elapsed
+        writer.close()
+        return elapsed
+
+    async def request(self, url: str) -> Tuple[int, str, str, int]:
+        # (code, title, redirect, time in ms); servers refusing HEAD and
+        # HTML pages get a GET that reads at most TITLE_BYTES of the body
+        session = await self.open()
+        start = time.monotonic()
+        async with session.head(url, allow_redirects=False) as response:
+            code = response.status
+            elapsed = int((time.monotonic() - start) * 1000)
+            location = response.headers.get('Location', '')
+            html = 'html' in response.headers.get('Content-Type', '')
+        title = ''
+        if code in (405, 501) or code == 200 and html:
+            async with session.get(url, allow_redirects=False) as response:
+                code = response.status
+                location = response.headers.get('Location', '')
+                match = TITLE_RE.search(await response.content.read(TITLE_BYTES))
+            if match:
+                title = ' '.join(unescape(match.group(1).decode('utf-8', 'replace')).split())[:200]
+        redirect = urllib.parse.urljoin(url, location) if location and 300 <= code < 400 else ''
+        return code, title, redirect, elapsed
+
+    async def probe(self, host: str, ips: Optional[List[str]] = None) -> Tuple[str, str, int, str, str, int]:
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.concurrency)
+        async with self.slots:
+            return await self.probe_host(host, ips)
+
+    async def probe_host(self, host: str, ips: Optional[List[str]]) -> Tuple[str, str, int, str, str, int]:
+        if ips:
+            self.addresses[host] = ips
+        try:
+            address = ips[0] if ips else host
+            connected = await asyncio.gather(*(self.connect(address, port) for port, _ in self.ports))
+            for (port, scheme), elapsed in zip(self.ports, connected):
+                if elapsed is None:
+                    continue
+                default = (scheme, port) in (('https', 443), ('http', 80))
+                url = f"{scheme}://{host}/" if default else f"{scheme}://{host}:{port}/"
+                try:
+                    code, title, redirect, elapsed = await self.request(url)
+                except aiohttp.ClientOSError as e:
+                    if e.errno in FD_ERRNOS:
+                        raise
+                    continue
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    continue
+                return ('active', url, code, title, redirect, elapsed)
+            times = [elapsed for elapsed in connected if elapsed is not None]
+            if times:
+                return ('open', '', 0, '', '', int(min(times) * 1000))
+            return ('inactive', '', 0, '', '', 0)
+        finally:
+            self.addresses.pop(host, None)
+
+
+class TokenBucket:
+    # Allows `rate` requests per second on average with bursts of `burst`
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SourceSpec:
+    def __init__(self, name: str, method: Optional[str], endpoint: str = '',
+                 concurrency: int = 4, rate: float = 0, burst: int = 1, retries: int = 3,
+                 backoff: float = 1.0, timeout: float = 10.0):
+        self.name = name
+        self.method = method
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+
+# Search methods register here with their request policy; run_all_searches
+# dispatches through this table and fetch enforces the policy per request
+SOURCES: Dict[str, SourceSpec] = {}
+DEFAULT_SOURCE = SourceSpec('', None)
+
+
+def register_source(name: str, **policy) -> Callable:
+    def decorator(method: Callable) -> Callable:
+        SOURCES[name] = SourceSpec(name, method.__name__, **policy)
+        return method
+    return decorator
+
+
+def retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    value = response.headers.get('Retry-After', '')
+    try:
+        return min(float(value), 300.0)
+    except ValueError:
+        return None
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class SourceMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.errors: Dict[str, int] = {}
+        self.fetches = 0
+        self.fetch_seconds = 0.0
+        self.fetch_max = 0.0
+        self.fetch_buckets = [0] * len(LATENCY_BUCKETS)
+        self.parse_seconds = 0.0
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.new = 0
+        self.duplicate = 0
+        self.invalid = 0
+
+    def error(self, error_class: str) -> None:
+        self.errors[error_class] = self.errors.get(error_class, 0) + 1
+
+    def merge(self, other: "SourceMetrics") -> None:
+        for name in ('requests', 'cache_hits', 'bytes_received', 'retries', 'fetches', 'fetch_seconds',
+                     'parse_seconds', 'searches', 'search_seconds', 'new', 'duplicate', 'invalid'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for error_class, count in other.errors.items():
+            self.errors[error_class] = self.errors.get(error_class, 0) + count
+        self.fetch_max = max(self.fetch_max, other.fetch_max)
+        self.fetch_buckets = [a + b for a, b in zip(self.fetch_buckets, other.fetch_buckets)]
+
+    def observe_fetch(self, seconds: float) -> None:
+        self.fetches += 1
+        self.fetch_seconds += seconds
+        self.fetch_max = max(self.fetch_max, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.fetch_buckets[i] += 1
+                break
+
+    def summary(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'bytes_received': self.bytes_received,
+            'retries': self.retries,
+            'errors': dict(self.errors),
+            'fetch': {
+                'count': self.fetches,
+                'seconds': round(self.fetch_seconds, 6),
+                'mean': round(self.fetch_seconds / self.fetches, 6) if self.fetches else 0,
+                'max': round(self.fetch_max, 6)
+            },
+            'parse_seconds': round(self.parse_seconds, 6),
+            'search': {
+                'count': self.searches,
+                'seconds': round(self.search_seconds, 6)
+            },
+            'results': {
+                'new': self.new,
+                'duplicate': self.duplicate,
+                'invalid': self.invalid
+            }
+        }
+
+
+class Metrics:
+    # Per-source counters for fetch/search instrumentation, exported as a
+    # JSON summary or in the Prometheus text exposition format
     def __init__(self):
-        self.results = {
-            'emails': set(),
-            'hosts': set(),
-            'ips': set(),
-            'shodan': [],
-            'dns': {},
-            'vulnerabilities': []
+        self.started = time.time()
+        self.sources: Dict[str, SourceMetrics] = {}
+
+    def get(self, source: str) -> SourceMetrics:
+        if source not in self.sources:
+            self.sources[source] = SourceMetrics()
+        return self.sources[source]
+
+    def merge(self, other: "Metrics") -> None:
+        for source, metrics in other.sources.items():
+            self.get(source).merge(metrics)
+
+    def summary(self) -> Dict:
+        return {
+            'started': datetime.fromtimestamp(self.started).isoformat(),
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            'sources': {name: m.summary() for name, m in sorted(self.sources.items())}
+        }
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, float]]) -> None:
+            lines.append(f"# HELP gsit_{name} {help_text}")
+            lines.append(f"# TYPE gsit_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"gsit_{name}{{{labels}}} {value}")
+
+        items = sorted(self.sources.items())
+        metric('requests_total', 'counter', 'HTTP requests sent, including retries.',
+               [(f'source="{s}"', m.requests) for s, m in items])
+        metric('cache_hits_total', 'counter', 'Responses served from the response cache.',
+               [(f'source="{s}"', m.cache_hits) for s, m in items])
+        metric('bytes_received_total', 'counter', 'Response body bytes received from the network.',
+               [(f'source="{s}"', m.bytes_received) for s, m in items])
+        metric('retries_total', 'counter', 'Requests retried after an error.',
+               [(f'source="{s}"', m.retries) for s, m in items])
+        metric('errors_total', 'counter', 'Failed request attempts by error class.',
+               [(f'source="{s}",error="{e}"', n) for s, m in items for e, n in sorted(m.errors.items())])
+        lines.append("# HELP gsit_fetch_duration_seconds Wall-clock time per fetch, including retries.")
+        lines.append("# TYPE gsit_fetch_duration_seconds histogram")
+        for s, m in items:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, m.fetch_buckets):
+                cumulative += count
+                lines.append(f'gsit_fetch_duration_seconds_bucket{{source="{s}",le="{bound}"}} {cumulative}')
+            lines.append(f'gsit_fetch_duration_seconds_bucket{{source="{s}",le="+Inf"}} {m.fetches}')
+            lines.append(f'gsit_fetch_duration_seconds_sum{{source="{s}"}} {m.fetch_seconds}')
+            lines.append(f'gsit_fetch_duration_seconds_count{{source="{s}"}} {m.fetches}')
+        metric('parse_seconds_total', 'counter', 'Time spent parsing responses.',
+               [(f'source="{s}"', m.parse_seconds) for s, m in items])
+        metric('search_seconds_total', 'counter', 'Wall-clock time spent in search methods.',
+               [(f'source="{s}"', m.search_seconds) for s, m in items])
+        metric('searches_total', 'counter', 'Completed search method calls.',
+               [(f'source="{s}"', m.searches) for s, m in items])
+        metric('results_total', 'counter', 'Extracted results by outcome.',
+               [(f'source="{s}",status="{status}"', getattr(m, status))
+                for s, m in items for status in ('new', 'duplicate', 'invalid')])
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"[+] Metrics written: {path}")
+
+    def write_prometheus(self, path: str) -> None:
+        # Write then rename so textfile collectors never read a partial file
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.prometheus())
+        os.replace(path + '.tmp', path)
+        print(f"[+] Prometheus metrics written: {path}")
+
+
+def new_results() -> Dict:
+    return {
+        'emails': set(),
+        'hosts': HostIndex(),
+        'ips': set(),
+        'shodan': [],
+        # Resolver answers, and host,ip pairs reported by sources; kept
+        # apart so neither overwrites the other (see host_ips)
+        'dns': {},
+        'reported': {},
+        'cnames': {},
+        'wildcards': set(),
+        'vulnerabilities': [],
+        'graph': EntityGraph(),
+        'probes': {}
+    }
+
+
+def host_ips(results: Dict, host: str) -> List[str]:
+    # The resolver's answer, then any addresses only sources reported
+    resolved = results['dns'].get(host, [])
+    reported = [ip for ip in results['reported'].get(host, ()) if ip not in resolved]
+    return resolved + reported if reported else resolved
+
+
+def merge_into(target: Dict, results: Dict) -> None:
+    target['hosts'].update(results['hosts'])
+    target['ips'].update(results['ips'])
+    target['emails'].update(results['emails'])
+    target['dns'].update(results['dns'])
+    for host, ips in results['reported'].items():
+        target['reported'].setdefault(host, []).extend(
+            ip for ip in ips if ip not in target['reported'].get(host, ()))
+    target['cnames'].update(results['cnames'])
+    target['wildcards'].update(results['wildcards'])
+    target['graph'].update(results['graph'])
+    target['probes'].update(results['probes'])
+
+
+# Shard workers hand results back as tab-separated records, one entity per
+# line, which streams and merges far cheaper than pickled sets:
+#   h <host> <ip,ip,...> <source,...>   i <ip> <source,...>
+#   e <email> <source,...>              c <host> <cname,...>
+#   w <host>                            d <diff as JSON>
+#   p <host> <probe fields...>          r <host> <ip,...>  (source-reported)
+def write_interchange(f, results: Dict) -> None:
+    dns, graph = results['dns'], results['graph']
+    for host in results['hosts']:
+        f.write(f"h\t{host}\t{','.join(dns.get(host, ()))}\t"
+                f"{','.join(graph.neighbours('host', host, 'source'))}\n")
+    for ip in results['ips']:
+        f.write(f"i\t{ip}\t{','.join(graph.neighbours('ip', ip, 'source'))}\n")
+    for email in results['emails']:
+        f.write(f"e\t{email}\t{','.join(graph.neighbours('email', email, 'source'))}\n")
+    for host, names in results['cnames'].items():
+        f.write(f"c\t{host}\t{','.join(names)}\n")
+    for host in results['wildcards']:
+        f.write(f"w\t{host}\n")
+    for host, probe in results['probes'].items():
+        f.write('\t'.join(['p', host, *map(str, probe)]) + '\n')
+    for host, ips in results['reported'].items():
+        f.write(f"r\t{host}\t{','.join(ips)}\n")
+
+
+def read_interchange(f, results: Dict) -> List[Dict]:
+    # Merges the records into results and returns any diffs found
+    diffs = []
+    hosts, dns, graph = results['hosts'], results['dns'], results['graph']
+    for line in f:
+        kind, _, value = line.rstrip('\n').partition('\t')
+        if kind == 'h':
+            host, ips, sources = value.split('\t')
+            hosts.add_normalized(host)
+            if ips:
+                dns[host] = ips.split(',')
+                graph.link_many('host', host, 'ip', dns[host])
+            for source in sources.split(',') if sources else []:
+                graph.link('source', source, 'host', host)
+        elif kind in ('i', 'e'):
+            value, _, sources = value.partition('\t')
+            results['ips' if kind == 'i' else 'emails'].add(value)
+            for source in sources.split(',') if sources else []:
+                graph.link('source', source, 'ip' if kind == 'i' else 'email', value)
+        elif kind == 'c':
+            host, _, names = value.partition('\t')
+            results['cnames'][host] = names.split(',')
+        elif kind == 'w':
+            results['wildcards'].add(value)
+        elif kind == 'p':
+            host, state, url, code, title, redirect, elapsed = value.split('\t')
+            results['probes'][host] = (state, url, int(code), title, redirect, int(elapsed))
+        elif kind == 'r':
+            host, _, ips = value.partition('\t')
+            reported = results['reported'].setdefault(host, [])
+            for ip in ips.split(','):
+                if ip not in reported:
+                    reported.append(ip)
+                    graph.link('host', host, 'ip', ip)
+        elif kind == 'd':
+            diffs.append(json.loads(value))
+    return diffs
+
+
+def read_domains(path: str) -> List[str]:
+    stream = sys.stdin if path == '-' else open(path)
+    try:
+        domains = []
+        seen = set()
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            domain = normalize_domain(line)
+            if domain is None:
+                print(f"[-] Skipping invalid domain on line {number}: {line}")
+            elif domain not in seen:
+                seen.add(domain)
+                domains.append(domain)
+        return domains
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'gsit'
+)
+
+# Seconds a cached response stays fresh, per source
+DEFAULT_CACHE_TTL = {
+    'bing': 6 * 3600,
+    'crtsh': 24 * 3600,
+    'hackertarget': 24 * 3600,
+    'anubis': 24 * 3600
+}
+
+
+class CacheWriter:
+    # Spools a streamed response to a temporary file and indexes it on commit
+    def __init__(self, cache: "ResponseCache", source: str, url: str):
+        self.cache = cache
+        self.source = source
+        self.url = url
+        self.key = cache.key(source, url)
+        self.tmp_path = cache.body_path(self.key) + f".{os.getpid()}.{id(self)}.tmp"
+        self.file = open(self.tmp_path, 'wb')
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, headers, encoding: str = 'utf-8') -> None:
+        self.file.close()
+        os.replace(self.tmp_path, self.cache.body_path(self.key))
+        self.cache.index(self.key, self.source, self.url, self.size, headers, encoding)
+
+    def abort(self) -> None:
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ResponseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, max_bytes: int = 512 << 20,
+                 ttl: Optional[Dict[str, int]] = None, mode: str = 'normal'):
+        # mode: 'normal' serves fresh entries, 'only' never touches the network,
+        # 'refresh' always refetches but still stores the new responses
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = dict(DEFAULT_CACHE_TTL)
+        self.ttl.update(ttl or {})
+        self.mode = mode
+        os.makedirs(path, exist_ok=True)
+        # WAL and a generous busy timeout let sharded worker processes share the cache
+        self.db = sqlite3.connect(os.path.join(path, 'index.db'), timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                url TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                encoding TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+        """)
+
+    @staticmethod
+    def key(source: str, url: str) -> str:
+        return hashlib.sha256(f"{source}\0{url}".encode()).hexdigest()
+
+    def body_path(self, key: str) -> str:
+        return os.path.join(self.path, key)
+
+    def lookup(self, source: str, url: str) -> Optional[sqlite3.Row]:
+        key = self.key(source, url)
+        entry = self.db.execute("SELECT * FROM responses WHERE key = ?", (key,)).fetchone()
+        if entry is not None and not os.path.exists(self.body_path(key)):
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.db.commit()
+            return None
+        return entry
+
+    def is_fresh(self, entry: sqlite3.Row) -> bool:
+        if self.mode == 'refresh':
+            return False
+        return time.time() - entry['fetched_at'] < self.ttl.get(entry['source'], 3600)
+
+    def validators(self, entry: Optional[sqlite3.Row]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None and self.mode != 'refresh':
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, entry: sqlite3.Row, revalidated: bool = False) -> None:
+        now = time.time()
+        if revalidated:
+            self.db.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                            (now, now, entry['key']))
+        else:
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, entry['key']))
+        self.db.commit()
+
+    def read_body(self, entry: sqlite3.Row) -> bytes:
+        self.touch(entry)
+        with open(self.body_path(entry['key']), 'rb') as f:
+            return f.read()
+
+    def iter_chunks(self, entry: sqlite3.Row, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        self.touch(entry)
+        with open(self.body_path(entry['key']), 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def open_writer(self, source: str, url: str) -> CacheWriter:
+        return CacheWriter(self, source, url)
+
+    def store(self, source: str, url: str, body: bytes, headers, encoding: str = 'utf-8') -> None:
+        writer = self.open_writer(source, url)
+        writer.write(body)
+        writer.commit(headers, encoding)
+
+    def index(self, key: str, source: str, url: str, size: int, headers, encoding: str) -> None:
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, source, url, size, headers.get('ETag'), headers.get('Last-Modified'),
+             encoding, now, now)
+        )
+        self.db.commit()
+        self.evict()
+
+    def evict(self) -> None:
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for row in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            if os.path.exists(self.body_path(row['key'])):
+                os.remove(self.body_path(row['key']))
+            self.db.execute("DELETE FROM responses WHERE key = ?", (row['key'],))
+            total -= row['size']
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+DEFAULT_STORE_PATH = os.path.join(
+    os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share')), 'gsit', 'results.db'
+)
+
+# Result kinds tracked across scans
+TRACKED_KINDS = ('hosts', 'ips', 'emails')
+# Stands in for the source of entities only the DNS resolver produced
+RESOLVER_SOURCE = 'resolver'
+
+
+class ResultStore:
+    # Keeps every entity ever seen per domain so consecutive scans can be
+    # diffed with set operations inside SQLite instead of reloading reports.
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                domain TEXT NOT NULL,
+                scanned_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS scans_domain ON scans (domain, id);
+            CREATE TABLE IF NOT EXISTS entities (
+                domain TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                last_scan INTEGER NOT NULL,
+                PRIMARY KEY (domain, kind, value)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS entities_last_scan ON entities (domain, last_scan);
+            CREATE TABLE IF NOT EXISTS sightings (
+                domain TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (domain, kind, value, source)
+            ) WITHOUT ROWID;
+        """)
+
+    def last_scan(self, domain: str) -> Optional[int]:
+        row = self.db.execute("SELECT MAX(id) FROM scans WHERE domain = ?", (domain,)).fetchone()
+        return row[0]
+
+    def record(self, domain: str, results: Dict, failed: Iterable[str] = (),
+               queried: Optional[Iterable[str]] = None) -> Dict:
+        # Each entity keeps the sources that reported it. A source that ran
+        # without failing and no longer reports an entity is dropped from it,
+        # and an entity disappears once no source is left. So a scan with
+        # fewer engines (-b crtsh), or one where a source failed, doesn't
+        # remove what only the other sources find. queried defaults to every
+        # source; entities no source reported (resolver answers) are
+        # attributed to RESOLVER_SOURCE
+        failed = sorted(failed)
+        now = datetime.now().isoformat()
+        previous = self.last_scan(domain)
+        graph = results['graph']
+        with self.db:
+            scan = self.db.execute("INSERT INTO scans (domain, scanned_at) VALUES (?, ?)",
+                                   (domain, now)).lastrowid
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS current (kind TEXT, value TEXT, source TEXT, "
+                            "PRIMARY KEY (kind, value, source)) WITHOUT ROWID")
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS queried (source TEXT PRIMARY KEY) WITHOUT ROWID")
+            self.db.execute("DELETE FROM current")
+            self.db.execute("DELETE FROM queried")
+            for kind in TRACKED_KINDS:
+                node = kind[:-1]
+                self.db.executemany("INSERT OR IGNORE INTO current VALUES (?, ?, ?)", (
+                    (kind, value, source) for value in results[kind]
+                    for source in graph.neighbours(node, value, 'source') or (RESOLVER_SOURCE,)))
+            if queried is None:
+                self.db.execute("INSERT INTO queried SELECT DISTINCT source FROM sightings WHERE domain = ? "
+                                "UNION SELECT source FROM current", (domain,))
+            else:
+                self.db.executemany("INSERT OR IGNORE INTO queried VALUES (?)",
+                                    ((source,) for source in queried))
+            self.db.executemany("DELETE FROM queried WHERE source = ?", ((source,) for source in failed))
+
+            added = self.db.execute(
+                "SELECT kind, value FROM current EXCEPT "
+                "SELECT kind, value FROM entities WHERE domain = ? AND last_scan = ?", (domain, previous)
+            ).fetchall()
+            self.db.execute(
+                "DELETE FROM sightings WHERE domain = ? AND source IN (SELECT source FROM queried) "
+                "AND NOT EXISTS (SELECT 1 FROM current WHERE current.kind = sightings.kind "
+                "AND current.value = sightings.value AND current.source = sightings.source)", (domain,))
+            self.db.execute("INSERT OR IGNORE INTO sightings SELECT ?, kind, value, source FROM current",
+                            (domain,))
+            removed = self.db.execute(
+                "SELECT kind, value FROM entities WHERE domain = ? AND last_scan = ? EXCEPT "
+                "SELECT kind, value FROM sightings WHERE domain = ?", (domain, previous, domain)
+            ).fetchall() if previous is not None else []
+            # Entities kept alive by sources this scan didn't (successfully)
+            # query stay in the snapshot, without touching last_seen
+            self.db.execute(
+                "UPDATE entities SET last_scan = ? WHERE domain = ? AND last_scan = ? "
+                "AND (kind, value) IN (SELECT kind, value FROM sightings WHERE domain = ?)",
+                (scan, domain, previous, domain))
+
+            self.db.execute(
+                "INSERT INTO entities SELECT DISTINCT ?, kind, value, ?, ?, ? FROM current WHERE true "
+                "ON CONFLICT (domain, kind, value) DO UPDATE SET "
+                "last_seen = excluded.last_seen, last_scan = excluded.last_scan",
+                (domain, now, now, scan)
+            )
+
+        diff = {
+            'domain': domain,
+            'date': now,
+            'scan': scan,
+            'previous_scan': previous,
+            'added': {kind: [] for kind in TRACKED_KINDS},
+            'removed': {kind: [] for kind in TRACKED_KINDS},
+            'failed_sources': failed
+        }
+        for kind, value in added:
+            diff['added'][kind].append(value)
+        for kind, value in removed:
+            diff['removed'][kind].append(value)
+        return diff
+
+    def close(self) -> None:
+        self.db.close()
+
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(DEFAULT_STORE_PATH), 'history')
+
+HISTORY_QUERIES = ('hosts', 'new-hosts', 'shared-ips')
+
+
+def parse_since(spec: str) -> datetime:
+    # "7d", "12h" or an ISO date
+    units = {'d': 86400, 'h': 3600, 'm': 60}
+    if spec[-1:] in units and spec[:-1].isdigit():
+        return datetime.fromtimestamp(time.time() - int(spec[:-1]) * units[spec[-1]])
+    return datetime.fromisoformat(spec)
+
+
+class HistoryStore:
+    # Append-only Parquet dataset with one row per observation (domain,
+    # kind, value, ip, the sources that found it, seen), hive-partitioned
+    # by month. Rows are sorted by domain within each file, so filters on
+    # month, domain, kind and seen prune partitions and row groups before
+    # anything is decoded.
+    # First/last seen are the min/max of seen at query time, so a row that
+    # is briefly duplicated while files are compacted changes no answer.
+    # Needs pyarrow; pandas is only used to print query answers.
+    def __init__(self, path: str = DEFAULT_HISTORY_DIR, flush_rows: int = 1_000_000,
+                 flush_interval: float = 300.0, compact_files: int = 32,
+                 compact_bytes: int = 64 << 20):
+        import pyarrow
+        self.pa = pyarrow
+        self.path = path
+        # Rows are buffered until there are flush_rows of them or
+        # flush_interval seconds have passed; a month partition is rewritten
+        # as one file once it holds compact_files files under compact_bytes
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.compact_files = compact_files
+        self.compact_bytes = compact_bytes
+        self.flushed = time.monotonic()
+        self.schema = pyarrow.schema([
+            ('domain', pyarrow.string()),
+            ('kind', pyarrow.string()),
+            ('value', pyarrow.string()),
+            ('ip', pyarrow.string()),
+            ('sources', pyarrow.string()),
+            ('seen', pyarrow.timestamp('s')),
+            ('month', pyarrow.string())
+        ])
+        self.columns: Dict[str, list] = {name: [] for name in self.schema.names}
+        self.files = 0
+
+    def append(self, domain: str, results: Dict) -> None:
+        seen = datetime.now().replace(microsecond=0)
+        rows = []
+        graph = results['graph']
+        for host in results['hosts']:
+            sources = ','.join(graph.neighbours('host', host, 'source'))
+            for ip in host_ips(results, host) or (None,):
+                rows.append(('host', host, ip, sources))
+        for kind, key in (('ip', 'ips'), ('email', 'emails')):
+            rows.extend((kind, value, None, ','.join(graph.neighbours(kind, value, 'source')))
+                        for value in results[key])
+
+        columns = self.columns
+        count = len(rows)
+        columns['domain'].extend(itertools.repeat(domain, count))
+        for name, values in zip(('kind', 'value', 'ip', 'sources'), zip(*rows) if rows else ((),) * 4):
+            columns[name].extend(values)
+        columns['seen'].extend(itertools.repeat(seen, count))
+        columns['month'].extend(itertools.repeat(seen.strftime('%Y-%m'), count))
+        if len(columns['domain']) >= self.flush_rows or self.due():
+            self.flush()
+
+    def due(self) -> bool:
+        return time.monotonic() - self.flushed >= self.flush_interval
+
+    def flush(self) -> None:
+        self.flushed = time.monotonic()
+        if not self.columns['domain']:
+            return
+        import pyarrow.dataset
+        table = self.pa.table(self.columns, schema=self.schema).sort_by([('domain', 'ascending'),
+                                                                         ('kind', 'ascending')])
+        months = set(self.columns['month'])
+        self.columns = {name: [] for name in self.schema.names}
+        self.files += 1
+        # Unique names so concurrent shard processes never collide
+        basename = f"part-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{self.files}-{{i}}.parquet"
+        pyarrow.dataset.write_dataset(
+            table, self.path, format='parquet',
+            partitioning=pyarrow.dataset.partitioning(self.pa.schema([('month', self.pa.string())]),
+                                                      flavor='hive'),
+            basename_template=basename,
+            existing_data_behavior='overwrite_or_ignore',
+            max_rows_per_group=1 << 17
+        )
+        for month in months:
+            self.compact(month)
+
+    def compact(self, month: str) -> None:
+        # Every flush adds a file, so frequent small runs would leave a
+        # partition of thousands of tiny files. Once there are enough, they
+        # are merged into one; the lock keeps concurrent processes from
+        # merging the same files twice, and one left by a crash expires
+        import pyarrow.dataset
+        import pyarrow.parquet
+        directory = os.path.join(self.path, f"month={month}")
+        small = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                 if name.endswith('.parquet')
+                 and os.path.getsize(os.path.join(directory, name)) < self.compact_bytes]
+        if len(small) < self.compact_files:
+            return
+        lock = os.path.join(self.path, f".compact-{month}.lock")
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if time.time() - os.path.getmtime(lock) > 3600:
+                os.remove(lock)
+            return
+        try:
+            schema = self.schema.remove(self.schema.get_field_index('month'))
+            table = pyarrow.dataset.dataset(small, schema=schema, format='parquet').to_table()
+            table = table.sort_by([('domain', 'ascending'), ('kind', 'ascending')])
+            # Dot-prefixed files are ignored by readers until renamed
+            partial = os.path.join(directory, f".compact-{os.getpid()}")
+            pyarrow.parquet.write_table(table, partial, row_group_size=1 << 17)
+            os.replace(partial, os.path.join(
+                directory, f"part-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{self.files}-compact.parquet"))
+            for path in small:
+                os.remove(path)
+        finally:
+            os.close(fd)
+            os.remove(lock)
+
+    def close(self) -> None:
+        self.flush()
+
+    def scan(self, columns: List[str], kind: str, domain: Optional[str] = None,
+             since: Optional[datetime] = None):
+        import pyarrow.compute as pc
+        import pyarrow.dataset
+        if not os.path.isdir(self.path):
+            return self.schema.empty_table().select(columns)
+        dataset = pyarrow.dataset.dataset(self.path, format='parquet', partitioning='hive')
+        condition = pc.field('kind') == kind
+        if domain:
+            condition &= pc.field('domain') == domain
+        if since:
+            condition &= pc.field('month') >= since.strftime('%Y-%m')
+            condition &= pc.field('seen') >= self.pa.scalar(since.replace(microsecond=0),
+                                                           self.pa.timestamp('s'))
+        return dataset.to_table(columns=columns, filter=condition)
+
+    def query(self, name: str, domain: Optional[str] = None, since: Optional[datetime] = None):
+        import pyarrow.compute as pc
+        if name in ('hosts', 'new-hosts'):
+            # First seen needs the whole history of each host, so only the
+            # domain and kind predicates are pushed down here
+            table = self.scan(['domain', 'value', 'seen'], 'host', domain,
+                              since if name == 'hosts' else None)
+            table = table.group_by(['domain', 'value']).aggregate([('seen', 'min'), ('seen', 'max')])
+            table = table.rename_columns(['domain', 'host', 'first_seen', 'last_seen'])
+            if name == 'new-hosts' and since:
+                table = table.filter(pc.field('first_seen') >= self.pa.scalar(
+                    since.replace(microsecond=0), self.pa.timestamp('s')))
+            table = table.sort_by([('domain', 'ascending'), ('host', 'ascending')])
+        elif name == 'shared-ips':
+            table = self.scan(['domain', 'value', 'seen'], 'ip', since=since)
+            if domain:
+                own = pc.unique(table.filter(pc.field('domain') == domain)['value'])
+                table = table.filter(pc.is_in(table['value'], value_set=own))
+            table = table.group_by('value').aggregate([('domain', 'count_distinct'), ('domain', 'distinct'),
+                                                       ('seen', 'min'), ('seen', 'max')])
+            table = table.rename_columns(['ip', 'domain_count', 'domains', 'first_seen', 'last_seen'])
+            table = table.filter(pc.field('domain_count') > 1)
+            table = table.sort_by([('domain_count', 'descending'), ('ip', 'ascending')])
+        else:
+            raise ValueError(f"unknown query: {name}")
+        return table.to_pandas()
+
+
+class JournalUnit:
+    # One source's search of one domain: whether any of its fetches failed
+    # and, when journaling, what it reported
+    def __init__(self, domain: str, source: str):
+        self.domain = domain
+        self.source = source
+        self.hosts: List[str] = []
+        self.ips: List[str] = []
+        self.emails: List[str] = []
+        self.pairs: List[Tuple[str, str]] = []
+        self.failed = False
+
+
+# The unit a search task is working on. Search methods run as their own
+# tasks, so fetch failures and extracted entities can be attributed to
+# their (domain, source) without passing it through every search method.
+CURRENT_UNIT: contextvars.ContextVar[Optional[JournalUnit]] = contextvars.ContextVar('current_unit', default=None)
+
+
+def unit_failed() -> None:
+    unit = CURRENT_UNIT.get()
+    if unit is not None:
+        unit.failed = True
+
+
+# Record kinds inside journal blocks: unit records, then the interchange
+# records and diff of finished domains
+JOURNAL_RECORDS = ('h', 'i', 'e', 'a', 'c', 'w', 'p', 'r', 'd')
+
+
+class ScanJournal:
+    # Append-only record of finished work so an interrupted run can resume.
+    # Each block is a run of tab-separated records closed by a commit line
+    # giving its length, so a block cut short by a crash is ignored:
+    #   h <host>  i <ip>  e <email>  a <host> <ip>   then  u <domain> <source> <n>
+    #     what a source reported for a domain; its fetches all succeeded
+    #   interchange records (see write_interchange) and the diff, then  D <domain> <n>
+    #     a finished domain with DNS and probe results
+    # Blocks are buffered and written with one fsync when flush_bytes have
+    # built up or flush_interval has passed, so a crash loses at most that
+    # window of work; finished domains are flushed as soon as the result
+    # store has committed them. Shard workers each append to <path>.shard-N.
+    def __init__(self, path: str, resume: bool = False, shard: Optional[int] = None,
+                 flush_bytes: int = 1 << 20, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.units: Dict[Tuple[str, str], List[str]] = {}
+        self.domains: Dict[str, List[str]] = {}
+        # Diffs of domains restored by this run, until record() hands them back
+        self.restored: Dict[str, List[Optional[Dict]]] = {}
+        self.buffer: List[str] = []
+        self.buffered = 0
+        self.last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        target = path if shard is None else f"{path}.shard-{shard}"
+        committed: Dict[str, int] = {}
+        if resume:
+            for name in [path] + self.shard_files():
+                if os.path.exists(name):
+                    committed[name] = self.load(name)
+        elif shard is None:
+            # A fresh run must not pick up shard journals left by an older one
+            for name in self.shard_files():
+                os.remove(name)
+        self.file = open(target, 'a' if resume else 'w')
+        if resume:
+            # Cut off a block torn by the crash, or the next record would be
+            # glued onto its partial last line
+            self.file.truncate(committed.get(target, 0))
+
+    def shard_files(self) -> List[str]:
+        directory = os.path.dirname(self.path) or '.'
+        pattern = re.escape(os.path.basename(self.path)) + r'\.shard-\d+'
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                      if re.fullmatch(pattern, name))
+
+    def load(self, name: str) -> int:
+        # Returns the offset just past the last commit line. A line that
+        # doesn't parse (older runs could glue a record onto a torn one)
+        # throws away the block it is in
+        block: List[str] = []
+        committed = offset = 0
+        with open(name, 'rb') as f:
+            for raw in f:
+                offset += len(raw)
+                if not raw.endswith(b'\n'):
+                    break
+                line = raw.decode('utf-8', 'replace')
+                kind, _, value = line.partition('\t')
+                if kind in ('u', 'D'):
+                    fields = value.rstrip('\n').split('\t')
+                    count = fields[-1]
+                    if len(fields) != (3 if kind == 'u' else 2) or not count.isdigit() or int(count) > len(block):
+                        block = []
+                        continue
+                    records = block[len(block) - int(count):]
+                    if kind == 'u':
+                        self.units[(fields[0], fields[1])] = records
+                    else:
+                        self.domains[fields[0]] = records
+                    block = []
+                    committed = offset
+                elif kind in JOURNAL_RECORDS:
+                    block.append(line)
+                else:
+                    block = []
+        return committed
+
+    def commit_unit(self, unit: JournalUnit) -> None:
+        lines = [f"h\t{host}\n" for host in unit.hosts]
+        lines += [f"i\t{ip}\n" for ip in unit.ips]
+        lines += [f"e\t{email}\n" for email in unit.emails]
+        lines += [f"a\t{host}\t{ip}\n" for host, ip in unit.pairs]
+        lines.append(f"u\t{unit.domain}\t{unit.source}\t{len(lines)}\n")
+        self.write(''.join(lines))
+
+    def commit_domain(self, domain: str, results: Dict, diff: Optional[Dict]) -> None:
+        block = io.StringIO()
+        write_interchange(block, results)
+        block.write(f"d\t{json.dumps(diff)}\n")
+        text = block.getvalue()
+        self.write(text + f"D\t{domain}\t{text.count(chr(10))}\n")
+
+    def write(self, text: str) -> None:
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.file.write(''.join(self.buffer))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.buffer = []
+            self.buffered = 0
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def remove(self) -> None:
+        # Called once a run has finished; there is nothing left to resume
+        self.close()
+        for name in [self.path] + self.shard_files():
+            if os.path.exists(name):
+                os.remove(name)
+
+
+# Column names accepted in headed range databases; headerless files are
+# read in iptoasn order: start, end, asn, country, org
+IPDB_COLUMNS = {
+    'start': ('start', 'range_start', 'ip_start', 'first_ip', 'start_ip'),
+    'end': ('end', 'range_end', 'ip_end', 'last_ip', 'end_ip'),
+    'network': ('network', 'cidr', 'prefix', 'netblock'),
+    'asn': ('asn', 'as_number', 'autonomous_system_number'),
+    'org': ('org', 'organization', 'as_name', 'as_description', 'autonomous_system_organization', 'name'),
+    'country': ('country', 'country_code', 'cc', 'country_iso_code'),
+}
+IPDB_FIELDS = ('asn', 'org', 'netblock', 'country')
+IPV4_STRUCT = struct.Struct('!I')
+IPV6_STRUCT = struct.Struct('!QQ')
+
+
+class IPDatabase:
+    # Offline ASN/geo lookups from a local range file: iptoasn-style TSV,
+    # CSV with start/end or network columns, or a .mmdb when the maxminddb
+    # package is installed. Ranges are kept sorted in packed integer arrays,
+    # uint32 for IPv4 and (high, low) uint64 pairs for IPv6, so a lookup is
+    # a bisect; IPv4 bisects only the ranges under the address's /16, found
+    # through a 65537-entry offset table. Overlapping ranges are cut into
+    # disjoint pieces owned by the most specific range, which is still the
+    # netblock reported for them. Lookups answer (asn, org, netblock, country).
+    def __init__(self, path: str):
+        self.path = path
+        self.records: List[Tuple[int, str, str]] = []
+        self.v4 = (array.array('I'), array.array('I'), array.array('I'))
+        self.v4_prefixes = array.array('I')
+        self.v6 = (array.array('Q'), array.array('Q'), array.array('Q'), array.array('Q'), array.array('I'))
+        self.found: Dict[Tuple[int, int], Tuple[int, str, str, str]] = {}
+        # (version, index) -> bounds of the range a cut-down piece came from
+        self.blocks: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self.build(self.read_mmdb() if path.endswith('.mmdb') else self.read_csv())
+
+    def read_csv(self) -> Iterator[Tuple[str, str, str, str, str]]:
+        # Yields (start, end, asn, org, country) with end empty for networks
+        with open(self.path, newline='', encoding='utf-8', errors='replace') as f:
+            first = f.readline()
+            reader = csv.reader(itertools.chain([first], f), delimiter='\t' if '\t' in first else ',')
+            row = next(reader, [])
+            header = [name.strip().lower() for name in row]
+            columns = {}
+            for field, names in IPDB_COLUMNS.items():
+                for i, name in enumerate(header):
+                    if name in names:
+                        columns[field] = i
+                        break
+            if 'start' not in columns and 'network' not in columns:
+                columns = {'start': 0, 'end': 1, 'asn': 2, 'country': 3, 'org': 4}
+                reader = itertools.chain([row], reader)
+            start = columns.get('start', columns.get('network'))
+            end, asn, org, country = (columns.get(field) for field in ('end', 'asn', 'org', 'country'))
+            for row in reader:
+                try:
+                    yield (row[start], row[end] if end is not None else '',
+                           row[asn] if asn is not None else '',
+                           row[org] if org is not None else '',
+                           row[country] if country is not None else '')
+                except IndexError:
+                    continue
+
+    def read_mmdb(self) -> Iterator[Tuple[str, str, str, str, str]]:
+        try:
+            import maxminddb
+        except ImportError:
+            sys.exit("[-] Reading .mmdb IP databases needs maxminddb (pip install maxminddb)")
+        with maxminddb.open_database(self.path) as reader:
+            for network, record in reader:
+                if not isinstance(record, dict):
+                    continue
+                country = record.get('country') or record.get('registered_country') or {}
+                yield (str(network), '',
+                       str(record.get('autonomous_system_number') or record.get('asn') or ''),
+                       record.get('autonomous_system_organization') or record.get('as_name') or '',
+                       country.get('iso_code', '') if isinstance(country, dict) else
+                       country or record.get('country_code', ''))
+
+    @staticmethod
+    def address_range(start: str, end: str) -> Optional[Tuple[int, int, int]]:
+        # (version, first, last) as integers for "start,end" or a network
+        try:
+            if not end:
+                network = ipaddress.ip_network(start, strict=False)
+                return network.version, int(network.network_address), int(network.broadcast_address)
+            if ':' in start:
+                first = int.from_bytes(socket.inet_pton(socket.AF_INET6, start), 'big')
+                return 6, first, int.from_bytes(socket.inet_pton(socket.AF_INET6, end), 'big')
+            first = int.from_bytes(socket.inet_aton(start), 'big')
+            return 4, first, int.from_bytes(socket.inet_aton(end), 'big')
+        except (OSError, ValueError):
+            return None
+
+    def build(self, ranges: Iterable[Tuple[str, str, str, str, str]]) -> None:
+        records: Dict[Tuple[int, str, str], int] = {}
+        v4, v6 = [], []
+        for start, end, asn, org, country in ranges:
+            asn = asn.strip().upper().removeprefix('AS')
+            asn = int(asn) if asn.isdigit() else 0
+            org, country = org.strip(), country.strip().upper()
+            # iptoasn lists unannounced space as AS0 "Not routed"
+            if not asn and (not org or org == 'Not routed'):
+                continue
+            parsed = self.address_range(start.strip(), end.strip())
+            if parsed is None or parsed[1] > parsed[2] or ':' in end and parsed[0] == 4:
+                continue
+            version, first, last = parsed
+            record = (asn, org, country if country != 'NONE' else '')
+            if record not in records:
+                records[record] = len(self.records)
+                self.records.append(record)
+            (v4 if version == 4 else v6).append((first, last, records[record]))
+
+        v4.sort()
+        starts, ends, values = self.v4
+        for first, last, owner in self.flatten(v4):
+            block_first, block_last, record = v4[owner]
+            if first != block_first or last != block_last:
+                self.blocks[(4, len(starts))] = (block_first, block_last)
+            starts.append(first)
+            ends.append(last)
+            values.append(record)
+        # v4_prefixes[p] is the first range starting at or after p << 16
+        position = 0
+        for prefix in range(65537):
+            while position < len(starts) and starts[position] < prefix << 16:
+                position += 1
+            self.v4_prefixes.append(position)
+        v6.sort()
+        start_high, start_low, end_high, end_low, values = self.v6
+        for first, last, owner in self.flatten(v6):
+            block_first, block_last, record = v6[owner]
+            if first != block_first or last != block_last:
+                self.blocks[(6, len(start_high))] = (block_first, block_last)
+            start_high.append(first >> 64)
+            start_low.append(first & 0xFFFFFFFFFFFFFFFF)
+            end_high.append(last >> 64)
+            end_low.append(last & 0xFFFFFFFFFFFFFFFF)
+            values.append(record)
+
+    @staticmethod
+    def flatten(ranges: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        # ranges is sorted by start; returns disjoint (first, last, owner)
+        # pieces where owner indexes the smallest range covering the piece,
+        # so a /24 announced inside a /8 answers for its own addresses
+        if all(ranges[i][1] < ranges[i + 1][0] for i in range(len(ranges) - 1)):
+            return [(first, last, i) for i, (first, last, _) in enumerate(ranges)]
+        bounds = sorted({first for first, _, _ in ranges} | {last + 1 for _, last, _ in ranges})
+        pieces: List[Tuple[int, int, int]] = []
+        covering: List[Tuple[int, int]] = []
+        position = 0
+        for start, stop in zip(bounds, bounds[1:]):
+            while position < len(ranges) and ranges[position][0] <= start:
+                first, last, _ = ranges[position]
+                heapq.heappush(covering, (last - first, position))
+                position += 1
+            # Ranges that ended are dropped once they are the smallest left
+            while covering and ranges[covering[0][1]][1] < start:
+                heapq.heappop(covering)
+            if not covering:
+                continue
+            owner = covering[0][1]
+            if pieces and pieces[-1][2] == owner and pieces[-1][1] == start - 1:
+                pieces[-1] = (pieces[-1][0], stop - 1, owner)
+            else:
+                pieces.append((start, stop - 1, owner))
+        return pieces
+
+    def __len__(self) -> int:
+        return len(self.v4[0]) + len(self.v6[0])
+
+    def lookup(self, ip: str) -> Optional[Tuple[int, str, str, str]]:
+        if ':' in ip:
+            return self.lookup_v6(ip)
+        try:
+            value, = IPV4_STRUCT.unpack(socket.inet_aton(ip))
+        except OSError:
+            return None
+        starts, ends, _ = self.v4
+        prefix = value >> 16
+        # The range holding value starts under its /16 or is the last one
+        # starting before it, at index v4_prefixes[prefix] - 1
+        i = bisect.bisect_right(starts, value, self.v4_prefixes[prefix], self.v4_prefixes[prefix + 1]) - 1
+        if i < 0 or ends[i] < value:
+            return None
+        return self.found.get((4, i)) or self.answer(4, i)
+
+    def lookup_v6(self, ip: str) -> Optional[Tuple[int, str, str, str]]:
+        try:
+            high, low = IPV6_STRUCT.unpack(socket.inet_pton(socket.AF_INET6, ip))
+        except OSError:
+            return None
+        start_high, start_low, end_high, end_low, _ = self.v6
+        # Last range starting at or before (high, low): bisect the high
+        # words, then the low words among ranges sharing this high word
+        left = bisect.bisect_left(start_high, high)
+        right = bisect.bisect_right(start_high, high, left)
+        i = max(bisect.bisect_right(start_low, low, left, right), left) - 1
+        if i < 0 or (end_high[i], end_low[i]) < (high, low):
+            return None
+        return self.found.get((6, i)) or self.answer(6, i)
+
+    def answer(self, version: int, i: int) -> Tuple[int, str, str, str]:
+        if version == 4:
+            first, last, record = self.v4[0][i], self.v4[1][i], self.v4[2][i]
+            address = ipaddress.IPv4Address
+        else:
+            start_high, start_low, end_high, end_low, values = self.v6
+            first, last = start_high[i] << 64 | start_low[i], end_high[i] << 64 | end_low[i]
+            record = values[i]
+            address = ipaddress.IPv6Address
+        first, last = self.blocks.get((version, i), (first, last))
+        first, last = address(first), address(last)
+        # Ranges that are not a single CIDR block are shown as first-last
+        networks = list(itertools.islice(ipaddress.summarize_address_range(first, last), 2))
+        netblock = str(networks[0]) if len(networks) == 1 else f"{first}-{last}"
+        asn, org, country = self.records[record]
+        self.found[(version, i)] = (asn, org, netblock, country)
+        return self.found[(version, i)]
+
+    def annotate(self, ips: Iterable[str]) -> Dict[str, Tuple[int, str, str, str]]:
+        lookup = self.lookup
+        return {ip: info for ip, info in ((ip, lookup(ip)) for ip in ips) if info}
+
+
+def group_netblocks(ipinfo: Dict[str, Tuple[int, str, str, str]]) -> List[Tuple[str, Tuple[int, str, str, str], List[str]]]:
+    # (netblock, info, ips) with the most populated netblocks first
+    groups: Dict[str, List[str]] = {}
+    for ip, info in ipinfo.items():
+        groups.setdefault(info[2], []).append(ip)
+    return sorted(((netblock, ipinfo[ips[0]], ips) for netblock, ips in groups.items()),
+                  key=lambda group: (-len(group[2]), group[0]))
+
+
+# Response parsers. They are pure module-level functions so they can run
+# inline, on a thread or in a worker process. All of them go through the
+# shared entity extractor and hand back (hosts, emails, ips, invalid) with
+# each list as one newline-joined string, which is cheap to pickle.
+
+def parse_bing_page(html: bytes, domain: str) -> Tuple[str, str, str, int]:
+    return extract_entities(html, domain)
+
+
+def parse_crtsh_batch(tail: bytes, data: bytes, domain: str,
+                      final: bool = False) -> Tuple[bytes, Tuple[str, str, str, int]]:
+    # Scans up to the last quote and carries the rest over to the next
+    # batch, so a name split across chunks is never cut in two
+    data = tail + data
+    cut = len(data) if final else data.rfind(b'"') + 1
+    return data[cut:], extract_entities(data[:cut], domain)
+
+
+def parse_hackertarget(text: bytes, domain: str) -> Tuple[Tuple[str, str, str, int], str]:
+    # The API answers "host,ip" lines; pairs whose host and address both
+    # passed the extractor are also returned for the DNS table
+    found = new_entities()
+    invalid = scan_entities(text, domain, found)
+    pairs = []
+    for line in text.lower().split(b'\n'):
+        host, _, ip = line.strip().partition(b',')
+        host, ip = host.decode('ascii', 'replace'), ip.decode('ascii', 'replace')
+        if host in found['host'] and ip in found['ip']:
+            pairs.append(f"{host},{ip}")
+    return pack_entities(found, invalid), '\n'.join(pairs)
+
+
+def parse_anubis(text: bytes, domain: str) -> Tuple[str, str, str, int]:
+    return extract_entities(text, domain)
+
+
+REPORT_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>GSIT Report for {{ domain }}</title>
+    <style>
+        :root {
+            --primary: #1a2b42;
+            --secondary: #3a5169;
+            --accent: #d4af37;
+            --light: #e8e6e3;
+            --dark: #0d1520;
+            --success: #4caf50;
+            --warning: #ff9800;
+            --danger: #f44336;
+        }
+
+        body {
+            font-family: 'Courier New', monospace;
+            background-color: var(--dark);
+            color: var(--light);
+            margin: 0;
+            padding: 0;
+            line-height: 1.6;
+        }
+
+        .container {
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+
+        header {
+            background-color: var(--primary);
+            padding: 20px 0;
+            border-bottom: 3px solid var(--accent);
+            margin-bottom: 30px;
+        }
+
+        h1, h2, h3 {
+            color: var(--accent);
+            font-weight: normal;
+        }
+
+        h1 {
+            font-size: 2.2rem;
+            letter-spacing: 1px;
+            margin: 0;
+        }
+
+        h2 {
+            font-size: 1.5rem;
+            border-bottom: 1px solid var(--secondary);
+            padding-bottom: 10px;
+            margin-top: 30px;
+        }
+
+        .report-meta {
+            display: flex;
+            justify-content: space-between;
+            background-color: var(--primary);
+            padding: 15px;
+            margin-bottom: 20px;
+            border-left: 4px solid var(--accent);
+        }
+
+        .badge {
+            display: inline-block;
+            padding: 3px 8px;
+            border-radius: 3px;
+            font-size: 0.8rem;
+            font-weight: bold;
+        }
+
+        .badge-success {
+            background-color: var(--success);
+            color: white;
+        }
+
+        .badge-warning {
+            background-color: var(--warning);
+            color: black;
+        }
+
+        .badge-danger {
+            background-color: var(--danger);
+            color: white;
+        }
+
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+            font-size: 0.9rem;
+        }
+
+        th {
+            background-color: var(--secondary);
+            color: var(--accent);
+            padding: 12px 15px;
+            text-align: left;
+            font-weight: normal;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+        }
+
+        td {
+            padding: 10px 15px;
+            border-bottom: 1px solid var(--secondary);
+            vertical-align: top;
+        }
+
+        tr:hover {
+            background-color: rgba(58, 81, 105, 0.3);
+        }
+
+        .section {
+            background-color: rgba(26, 43, 66, 0.5);
+            padding: 20px;
+            margin-bottom: 30px;
+            border-radius: 5px;
+            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2);
+        }
+
+        .summary-cards {
+            display: grid;
+            grid-template-columns: repeat(auto-fill, minmax(250px, 1fr));
+            gap: 20px;
+            margin-bottom: 30px;
+        }
+
+        .card {
+            background-color: var(--primary);
+            padding: 20px;
+            border-radius: 5px;
+            border-left: 4px solid var(--accent);
+        }
+
+        .card h3 {
+            margin-top: 0;
+            font-size: 1.1rem;
+        }
+
+        .card-value {
+            font-size: 1.8rem;
+            font-weight: bold;
+            margin: 10px 0;
+        }
+
+        .filters {
+            margin-bottom: 20px;
+            display: flex;
+            gap: 10px;
+        }
+
+        .filter-btn {
+            background-color: var(--secondary);
+            border: none;
+            color: var(--light);
+            padding: 8px 15px;
+            border-radius: 3px;
+            cursor: pointer;
+            transition: all 0.3s;
+        }
+
+        .filter-btn:hover, .filter-btn.active {
+            background-color: var(--accent);
+            color: var(--dark);
         }
+
+        .hidden {
+            display: none;
+        }
+
+        footer {
+            text-align: center;
+            margin-top: 50px;
+            padding: 20px;
+            border-top: 1px solid var(--secondary);
+            font-size: 0.8rem;
+            color: var(--secondary);
+        }
+
+        /* Terminal-like elements */
+        .terminal {
+            background-color: #0a0a0a;
+            border: 1px solid var(--accent);
+            border-radius: 5px;
+            padding: 15px;
+            font-family: 'Courier New', monospace;
+            margin: 20px 0;
+            overflow-x: auto;
+        }
+
+        .command-line {
+            color: var(--accent);
+        }
+
+        .blinking-cursor {
+            animation: blink 1s step-end infinite;
+        }
+
+        @keyframes blink {
+            from, to { opacity: 1; }
+            50% { opacity: 0; }
+        }
+
+        /* Responsive adjustments */
+        @media (max-width: 768px) {
+            .summary-cards {
+                grid-template-columns: 1fr;
+            }
+        }
+    </style>
+</head>
+<body>
+    <header>
+        <div class="container">
+            <h1>GSIT INTELLIGENCE REPORT</h1>
+        </div>
+    </header>
+
+    <div class="container">
+        <div class="report-meta">
+            <div>
+                <strong>Target:</strong> {{ domain }}<br>
+                <strong>Date:</strong> {{ timestamp }}
+            </div>
+            <div>
+                <span class="badge badge-success">CONFIDENTIAL</span>
+            </div>
+        </div>
+
+        <div class="summary-cards">
+            <div class="card">
+                <h3>Hosts Discovered</h3>
+                <div class="card-value">{{ host_count }}</div>
+                <div>{{ subdomain_count }} subdomains, {{ host_count - subdomain_count }} external</div>
+            </div>
+            <div class="card">
+                <h3>IP Addresses</h3>
+                <div class="card-value">{{ ip_count }}</div>
+            </div>
+            <div class="card">
+                <h3>Emails Found</h3>
+                <div class="card-value">{{ email_count }}</div>
+            </div>
+            <div class="card">
+                <h3>Data Sources</h3>
+                <div class="card-value">{{ sources|length }}</div>
+            </div>
+        </div>
+
+        <div class="terminal">
+            <div class="command-line">$ gsit -d {{ domain }} -b {{ sources|join(',') }} -l {{ limit }}<span class="blinking-cursor">_</span></div>
+        </div>
+
+        <div class="section">
+            <h2>Host Discovery Results</h2>
+            <div class="filters">
+                <button class="filter-btn active" onclick="filterTable('all')">All</button>
+                <button class="filter-btn" onclick="filterTable('subdomains')">Subdomains</button>
+                <button class="filter-btn" onclick="filterTable('external')">External</button>
+            </div>
+            {% if pages %}
+            <div class="filters">
+                <button class="filter-btn" onclick="showPage(currentPage - 1)">Prev</button>
+                <span id="page-label"></span>
+                <button class="filter-btn" onclick="showPage(currentPage + 1)">Next</button>
+            </div>
+            {% endif %}
+            <table id="hosts-table">
+                <thead>
+                    <tr>
+                        <th>Host</th>
+                        <th>First Seen</th>
+                        <th>Source</th>
+                        <th>Status</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% if not pages %}
+                    {% set badges = {'active': 'badge-success', 'open': 'badge-warning', 'inactive': 'badge-danger'} %}
+                    {% for host, host_in_scope, host_sources, probe in hosts %}
+                    <tr class="{% if host_in_scope %}subdomain{% else %}external{% endif %}">
+                        <td>{{ host }}</td>
+                        <td>{{ timestamp.split(' ')[0] }}</td>
+                        <td>{{ host_sources|join(', ') }}</td>
+                        <td><span class="badge {{ badges.get(probe[0], 'badge-warning') if probe else 'badge-warning' }}">
+                            {{ probe[0]|title if probe else 'Unknown' }}
+                        </span>{% if probe and probe[0] != 'inactive' %} {{ probe_detail(probe) }}{% endif %}</td>
+                    </tr>
+                    {% endfor %}
+                    {% endif %}
+                </tbody>
+            </table>
+        </div>
+
+        {% if ip_count %}
+        <div class="section">
+            <h2>IP Addresses</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>IP</th>
+                        <th>Host</th>
+                        <th>ASN</th>
+                        <th>Organization</th>
+                        <th>Netblock</th>
+                        <th>Country</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for ip, ip_hosts, ip_info in ips %}
+                    <tr>
+                        <td>{{ ip }}</td>
+                        <td>{{ ip_hosts[:3]|join(', ') or 'N/A' }}{% if ip_hosts|length > 3 %} (+{{ ip_hosts|length - 3 }} more){% endif %}</td>
+                        {% if ip_info %}
+                        <td>{{ 'AS%d'|format(ip_info[0]) if ip_info[0] else '' }}</td>
+                        <td>{{ ip_info[1] }}</td>
+                        <td>{{ ip_info[2] }}</td>
+                        <td>{{ ip_info[3] or 'Unknown' }}</td>
+                        {% else %}
+                        <td colspan="4">Unknown</td>
+                        {% endif %}
+                    </tr>
+                    {% endfor %}
+                </tbody>
+            </table>
+        </div>
+        {% endif %}
+
+        {% if netblocks %}
+        <div class="section">
+            <h2>Netblocks</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>Netblock</th>
+                        <th>ASN</th>
+                        <th>Organization</th>
+                        <th>Country</th>
+                        <th>IPs</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for netblock, info, netblock_ips in netblocks %}
+                    <tr>
+                        <td>{{ netblock }}</td>
+                        <td>{{ 'AS%d'|format(info[0]) if info[0] else '' }}</td>
+                        <td>{{ info[1] }}</td>
+                        <td>{{ info[3] or 'Unknown' }}</td>
+                        <td>{{ netblock_ips|length }}</td>
+                    </tr>
+                    {% endfor %}
+                </tbody>
+            </table>
+        </div>
+        {% endif %}
+
+        <div class="section">
+            <h2>Data Sources Used</h2>
+            <ul>
+                {% for source in sources %}
+                <li>{{ source|upper }}</li>
+                {% endfor %}
+            </ul>
+        </div>
+
+        <footer>
+            GSIT v1.0 | Generated by Global Search Intelligence Tool | {{ timestamp }}
+        </footer>
+    </div>
+
+    <script>
+        // Table filtering functionality
+        function filterTable(type) {
+            const rows = document.querySelectorAll('#hosts-table tbody tr');
+            const buttons = document.querySelectorAll('.filter-btn');
+
+            buttons.forEach(btn => btn.classList.remove('active'));
+            event.currentTarget.classList.add('active');
+
+            rows.forEach(row => {
+                row.style.display = 'table-row';
+                if (type === 'subdomains' && !row.classList.contains('subdomain')) {
+                    row.style.display = 'none';
+                } else if (type === 'external' && !row.classList.contains('external')) {
+                    row.style.display = 'none';
+                }
+            });
+        }
+
+        // Sort table functionality
+        function sortTable(columnIndex) {
+            const table = document.getElementById('hosts-table');
+            const rows = Array.from(table.querySelectorAll('tbody tr'));
+            const header = table.querySelectorAll('thead th')[columnIndex];
+            const isAsc = header.getAttribute('data-sort') === 'asc';
+
+            // Reset all headers
+            table.querySelectorAll('thead th').forEach(th => {
+                th.removeAttribute('data-sort');
+            });
+
+            // Sort rows
+            rows.sort((a, b) => {
+                const aValue = a.cells[columnIndex].textContent;
+                const bValue = b.cells[columnIndex].textContent;
+
+                if (columnIndex === 3) { // Status column
+                    return isAsc 
+                        ? aValue.localeCompare(bValue)
+                        : bValue.localeCompare(aValue);
+                } else {
+                    return isAsc 
+                        ? aValue.localeCompare(bValue)
+                        : bValue.localeCompare(aValue);
+                }
+            });
+
+            // Update table
+            rows.forEach(row => table.tBodies[0].appendChild(row));
+
+            // Update header
+            header.setAttribute('data-sort', isAsc ? 'desc' : 'asc');
+        }
+
+        {% if pages %}
+        // Host rows live in {{ data_dir }}/hosts_N.js and are loaded on demand;
+        // script tags keep this working when the report is opened from disk
+        const pageCount = {{ pages }};
+        const loadedPages = {};
+        let currentPage = 0;
+
+        function gsitHosts(page, rows) {
+            loadedPages[page] = rows;
+            if (page === currentPage) {
+                renderPage(page);
+            }
+        }
+
+        function renderPage(page) {
+            const tbody = document.querySelector('#hosts-table tbody');
+            const badges = {active: 'badge-success', open: 'badge-warning', inactive: 'badge-danger'};
+            tbody.innerHTML = '';
+            loadedPages[page].forEach(row => {
+                const tr = document.createElement('tr');
+                tr.className = row[1];
+                [row[0], {{ timestamp.split(' ')[0]|tojson }}, row[2]].forEach(value => {
+                    const td = document.createElement('td');
+                    td.textContent = value;
+                    tr.appendChild(td);
+                });
+                // row[3] is [state, detail] from the prober, or null
+                const state = row[3] ? row[3][0] : 'unknown';
+                const td = document.createElement('td');
+                const badge = document.createElement('span');
+                badge.className = 'badge ' + (badges[state] || 'badge-warning');
+                badge.textContent = state.charAt(0).toUpperCase() + state.slice(1);
+                td.appendChild(badge);
+                if (row[3] && row[3][1]) {
+                    td.appendChild(document.createTextNode(' ' + row[3][1]));
+                }
+                tr.appendChild(td);
+                tbody.appendChild(tr);
+            });
+        }
+
+        function showPage(page) {
+            if (page < 1 || page > pageCount) {
+                return;
+            }
+            currentPage = page;
+            document.getElementById('page-label').textContent = 'Page ' + page + ' of ' + pageCount;
+            if (loadedPages[page]) {
+                renderPage(page);
+                return;
+            }
+            const script = document.createElement('script');
+            script.src = {{ data_dir|tojson }} + '/hosts_' + page + '.js';
+            document.body.appendChild(script);
+        }
+
+        document.addEventListener('DOMContentLoaded', () => showPage(1));
+        {% endif %}
+
+        // Make table headers clickable
+        document.addEventListener('DOMContentLoaded', function() {
+            const headers = document.querySelectorAll('#hosts-table th');
+            headers.forEach((header, index) => {
+                header.style.cursor = 'pointer';
+                header.addEventListener('click', () => sortTable(index));
+            });
+        });
+    </script>
+</body>
+</html>
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def report_template() -> "Template":
+    # Compiled once per process and reused by every report
+    from jinja2 import Environment
+    return Environment(autoescape=True).from_string(REPORT_TEMPLATE)
+
+
+def probe_detail(probe: Tuple[str, str, int, str, str, int]) -> str:
+    # "301 · → https://example.com/ · 42 ms" for the Status column
+    state, _, code, title, redirect, elapsed = probe
+    parts = [str(code)] if code else []
+    if title:
+        parts.append(title)
+    if redirect:
+        parts.append(f"\u2192 {redirect}")
+    if state != 'inactive':
+        parts.append(f"{elapsed} ms")
+    return ' \u00b7 '.join(parts)
+
+
+def write_json_object(f, items: Iterable[Tuple[str, object]], indent: str) -> None:
+    empty = True
+    for key, value in items:
+        f.write(('{\n' if empty else ',\n') + indent + '  ' + json.dumps(key) + ': ' + json.dumps(value))
+        empty = False
+    f.write('{}' if empty else '\n' + indent + '}')
+
+
+def write_json_array(f, values: Iterable, indent: str) -> None:
+    # Writes values as json.dump(..., indent=2) would, one item at a time
+    empty = True
+    for value in values:
+        f.write(('[\n' if empty else ',\n') + indent + '  ' + json.dumps(value))
+        empty = False
+    f.write('[]' if empty else '\n' + indent + ']')
+
+
+class SharedSlot:
+    # A source's concurrency cap shared by the shard worker processes: the
+    # local semaphore queues this process's requests, then a slot is taken
+    # from the cross-process one. Polled, since a blocking acquire would
+    # stall the event loop and can't be cancelled
+    def __init__(self, shared, concurrency: int):
+        self.shared = shared
+        self.local = asyncio.Semaphore(concurrency)
+
+    async def __aenter__(self) -> None:
+        await self.local.acquire()
+        try:
+            while not self.shared.acquire(False):
+                await asyncio.sleep(0.05)
+        except BaseException:
+            self.local.release()
+            raise
+
+    async def __aexit__(self, *exc) -> None:
+        self.shared.release()
+        self.local.release()
+
+
+# Cross-process source semaphores, set in each shard worker by the pool
+# initializer (multiprocessing semaphores can only be inherited, not sent)
+SHARD_SLOTS: Dict = {}
+
+
+def init_shard_worker(slots: Dict) -> None:
+    SHARD_SLOTS.update(slots)
+
+
+class GSIT:
+    def __init__(self):
+        self.results = new_results()
+        # Per-domain results for batch scans; self.domain maps to self.results
+        self.domain_results: Dict[str, Dict] = {}
         self.verbose = False
         self.limit = 100
+        # Hosts per lazily loaded HTML page; 0 keeps every row inline
+        self.page_size = 0
         self.domain = ""
         self.sources_used = []
         self.user_agent = "Mozilla/5.0 (compatible; GSIT/1.0; +https://github.com/yourrepo/gsit)"
+        # Connection pool settings for the shared session
+        self.max_connections = 100
+        self.max_connections_per_host = 10
+        self.keepalive_timeout = 30
+        self.dns_cache_ttl = 300
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.cache: Optional[ResponseCache] = None
+        self.store: Optional[ResultStore] = None
+        self.history: Optional[HistoryStore] = None
+        self.resolver: Optional[DNSResolver] = None
+        self.ipdb: Optional[IPDatabase] = None
+        self.prober: Optional[HostProber] = None
+        self.journal: Optional[ScanJournal] = None
+        # Sources whose fetches gave up, per scanned domain, until recorded
+        self.failed_sources: Dict[str, set] = {}
+        # Sources each domain is being scanned with, until recorded
+        self.queried_sources: Dict[str, List[str]] = {}
+        # Batch domains whose scan raised; the rest of the batch goes on
+        self.failed_domains: List[str] = []
+        # Batch scheduling: domains in flight; per-source limits live in SOURCES
+        self.concurrency = 20
+        self.source_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Source name -> semaphore shared with the other shard workers
+        self.shared_slots: Dict = {}
+        self.rate_limiters: Dict[str, TokenBucket] = {}
+        self.metrics = Metrics()
+        # Response parsing: 0 workers parses on the event loop, otherwise
+        # bodies of at least parse_offload_min bytes go to a thread/process pool
+        self.parse_workers = 0
+        self.parse_mode = 'process'
+        self.parse_offload_min = 64 << 10
+        self.parse_batch_size = 1 << 20
+        self.parse_pool: Optional[concurrent.futures.Executor] = None
+        # Per-source base URL overrides, e.g. to point sources at a replay server
+        self.endpoints: Dict[str, str] = {}
+        # Discovery pipeline: new hosts are queued per scanned domain while the
+        # searches run; recursive queries on found subdomains map back to it
+        self.pipelines: Dict[str, asyncio.Queue] = {}
+        self.scan_roots: Dict[str, str] = {}
+        self.recursive_depth = 0
+        self.max_recursive = 100
+        # NDJSON file receiving host/dns events as they are discovered, and
+        # callbacks receiving the same events (used by the service mode)
+        self.event_stream = None
+        self.listeners: List[Callable[[Dict], None]] = []
 
-    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
-        try:
-            async with session.get(url, headers={'User-Agent': self.user_agent}, timeout=10) as response:
-                return await response.text()
-        except Exception as e:
+    async def __aenter__(self) -> "GSIT":
+        await self.get_session()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    'User-Agent': self.user_agent,
+                    'Accept-Encoding': accept_encoding()
+                }
+            )
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        if self.resolver is not None:
+            self.resolver.close()
+        if self.prober is not None:
+            await self.prober.close()
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+            self.parse_pool = None
+
+    def results_for(self, domain: str) -> Dict:
+        domain = self.scan_roots.get(domain, domain)
+        if domain == self.domain:
+            return self.results
+        if domain not in self.domain_results:
+            self.domain_results[domain] = new_results()
+        return self.domain_results[domain]
+
+    def merge_results(self) -> None:
+        for results in self.domain_results.values():
+            merge_into(self.results, results)
+
+    def record(self, domain: str) -> Optional[Dict]:
+        # Domains restored from the journal were recorded by the interrupted
+        # run; hand back the diff it journaled
+        if self.journal is not None and domain in self.journal.restored:
+            self.queried_sources.pop(domain, None)
+            diffs = self.journal.restored.pop(domain)
+            # Its history rows may still have been buffered when the run was
+            # killed; a second copy of rows that did get out changes no answer
+            if self.history is not None:
+                self.history.append(domain, self.results_for(domain))
+            return diffs[0] if diffs else None
+        results = self.results_for(domain)
+        failed = self.failed_sources.pop(domain, ())
+        queried = self.queried_sources.pop(domain, None)
+        if self.history is not None:
+            self.history.append(domain, results)
+        diff = self.store.record(domain, results, failed, queried) if self.store is not None else None
+        if self.journal is not None:
+            self.journal.commit_domain(domain, results, diff)
+            if self.store is not None:
+                # The store has this scan now; a domain missing from the
+                # journal would be rescanned and diffed against itself
+                self.journal.flush()
+        return diff
+
+    def endpoint(self, source: str) -> str:
+        return self.endpoints.get(source) or SOURCES[source].endpoint
+
+    def source_slot(self, source: str):
+        if source not in self.source_semaphores:
+            spec = SOURCES.get(source, DEFAULT_SOURCE)
+            if source in self.shared_slots:
+                self.source_semaphores[source] = SharedSlot(self.shared_slots[source], spec.concurrency)
+            else:
+                self.source_semaphores[source] = asyncio.Semaphore(spec.concurrency)
+        return self.source_semaphores[source]
+
+    def rate_limiter(self, source: str) -> TokenBucket:
+        if source not in self.rate_limiters:
+            spec = SOURCES.get(source, DEFAULT_SOURCE)
+            self.rate_limiters[source] = TokenBucket(spec.rate, spec.burst)
+        return self.rate_limiters[source]
+
+    async def open_response(self, url: str, source: str, headers: Dict[str, str],
+                            timeout: aiohttp.ClientTimeout) -> Optional[aiohttp.ClientResponse]:
+        # Retries connection errors, 429 and 5xx with exponential backoff,
+        # honouring Retry-After; the caller must release the response
+        spec = SOURCES.get(source, DEFAULT_SOURCE)
+        metrics = self.metrics.get(source)
+        session = await self.get_session()
+        error = ''
+        for attempt in range(spec.retries + 1):
+            await self.rate_limiter(source).acquire()
+            metrics.requests += 1
+            delay = None
+            try:
+                response = await session.get(url, headers=headers, timeout=timeout)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or e.__class__.__name__
+                error_class = e.__class__.__name__
+            else:
+                if response.status != 429 and response.status < 500:
+                    return response
+                error = f"HTTP {response.status}"
+                error_class = f"HTTP{response.status}"
+                delay = retry_after(response)
+                response.release()
+            metrics.error(error_class)
+            if attempt < spec.retries:
+                metrics.retries += 1
+                if delay is None:
+                    delay = spec.backoff * 2 ** attempt * (0.5 + random.random())
+                if self.verbose:
+                    print(f"[-] {error} from {url}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        print(f"[-] Giving up on {url} after {spec.retries + 1} attempts: {error}")
+        unit_failed()
+        return None
+
+    def http_error(self, url: str, source: str, status: int) -> None:
+        # A final 4xx. 404 is how most sources say "nothing found"; anything
+        # else (401, 403 block pages, 410...) means results are missing
+        self.metrics.get(source).error(f"HTTP{status}")
+        if status == 404:
             if self.verbose:
-                print(f"[-] Error fetching {url}: {str(e)}")
+                print(f"[-] Error fetching {url}: HTTP {status}")
+            return
+        print(f"[-] Error fetching {url}: HTTP {status}")
+        unit_failed()
+
+    async def fetch(self, url: str, source: str = '') -> Optional[bytes]:
+        metrics = self.metrics.get(source)
+        cache = self.cache
+        entry = cache.lookup(source, url) if cache else None
+        if entry is not None and (cache.mode == 'only' or cache.is_fresh(entry)):
+            metrics.cache_hits += 1
+            return cache.read_body(entry)
+        if cache and cache.mode == 'only':
+            unit_failed()
             return None
 
+        start = time.monotonic()
+        try:
+            return await self.fetch_network(url, source, entry)
+        finally:
+            metrics.observe_fetch(time.monotonic() - start)
+
+    async def fetch_network(self, url: str, source: str,
+                            entry: Optional[sqlite3.Row]) -> Optional[bytes]:
+        metrics = self.metrics.get(source)
+        cache = self.cache
+        headers = cache.validators(entry) if cache else {}
+        timeout = aiohttp.ClientTimeout(total=SOURCES.get(source, DEFAULT_SOURCE).timeout)
+        async with self.source_slot(source):
+            response = await self.open_response(url, source, headers, timeout)
+            if response is None:
+                return None
+            try:
+                async with response:
+                    if response.status == 304 and entry is not None:
+                        metrics.cache_hits += 1
+                        cache.touch(entry, revalidated=True)
+                        return cache.read_body(entry)
+                    if response.status >= 400:
+                        self.http_error(url, source, response.status)
+                        return None
+                    body = await response.read()
+                    metrics.bytes_received += len(body)
+                    if cache and response.status == 200:
+                        cache.store(source, url, body, response.headers, response.charset or 'utf-8')
+                    return body
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.error(e.__class__.__name__)
+                print(f"[-] Error fetching {url}: {str(e) or e.__class__.__name__}")
+                unit_failed()
+                return None
+
+    async def fetch_stream(self, url: str, source: str = '',
+                           chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+        metrics = self.metrics.get(source)
+        cache = self.cache
+        entry = cache.lookup(source, url) if cache else None
+        if entry is not None and (cache.mode == 'only' or cache.is_fresh(entry)):
+            metrics.cache_hits += 1
+            for chunk in cache.iter_chunks(entry, chunk_size):
+                yield chunk
+            return
+        if cache and cache.mode == 'only':
+            unit_failed()
+            return
+
+        headers = cache.validators(entry) if cache else {}
+        # Large bodies take a while to arrive, so only time out on stalls
+        spec = SOURCES.get(source, DEFAULT_SOURCE)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=spec.timeout, sock_read=30)
+        writer = None
+        start = time.monotonic()
+        async with self.source_slot(source):
+            # Retries only happen before the first byte; a stream cut off
+            # halfway is reported and the partial results are kept
+            response = await self.open_response(url, source, headers, timeout)
+            if response is None:
+                return
+            try:
+                async with response:
+                    if response.status == 304 and entry is not None:
+                        metrics.cache_hits += 1
+                        cache.touch(entry, revalidated=True)
+                        for chunk in cache.iter_chunks(entry, chunk_size):
+                            yield chunk
+                        return
+                    if response.status >= 400:
+                        self.http_error(url, source, response.status)
+                        return
+                    if cache and response.status == 200:
+                        writer = cache.open_writer(source, url)
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        metrics.bytes_received += len(chunk)
+                        if writer:
+                            writer.write(chunk)
+                        yield chunk
+                    if writer:
+                        writer.commit(response.headers, response.charset or 'utf-8')
+                        writer = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.error(e.__class__.__name__)
+                print(f"[-] Error fetching {url}: {str(e) or e.__class__.__name__}")
+                unit_failed()
+            finally:
+                metrics.observe_fetch(time.monotonic() - start)
+                if writer:
+                    writer.abort()
+
+    async def parse(self, source: str, size: int, func: Callable, *args):
+        start = time.perf_counter()
+        try:
+            if not self.parse_workers or size < self.parse_offload_min:
+                return func(*args)
+            if self.parse_pool is None:
+                if self.parse_mode == 'thread':
+                    self.parse_pool = concurrent.futures.ThreadPoolExecutor(self.parse_workers)
+                else:
+                    # Never fork: the parent has a running loop, open sockets
+                    # and sqlite connections that a forked child would inherit
+                    self.parse_pool = concurrent.futures.ProcessPoolExecutor(
+                        self.parse_workers, mp_context=multiprocessing.get_context('spawn'))
+            return await asyncio.get_running_loop().run_in_executor(self.parse_pool, func, *args)
+        finally:
+            self.metrics.get(source).parse_seconds += time.perf_counter() - start
+
+    def add_hosts(self, domain: str, source: str, names: str, invalid: int = 0) -> List[str]:
+        # names are canonical host names from one of the parse_* functions;
+        # new ones are handed to the domain's pipeline if a scan is running
+        results = self.results_for(domain)
+        pipeline = self.pipelines.get(self.scan_roots.get(domain, domain))
+        metrics = self.metrics.get(source)
+        metrics.invalid += invalid
+        hosts = names.split('\n') if names else []
+        results['graph'].link_many('source', source, 'host', hosts)
+        unit = CURRENT_UNIT.get()
+        if unit is not None and self.journal is not None:
+            unit.hosts.extend(hosts)
+        for host in hosts:
+            if results['hosts'].add_normalized(host):
+                metrics.new += 1
+                if pipeline is not None:
+                    pipeline.put_nowait((host, source))
+            else:
+                metrics.duplicate += 1
+        return hosts
+
+    def add_ip(self, domain: str, source: str, ip: str) -> None:
+        results = self.results_for(domain)
+        results['graph'].link('source', source, 'ip', ip)
+        unit = CURRENT_UNIT.get()
+        if unit is not None and self.journal is not None:
+            unit.ips.append(ip)
+        metrics = self.metrics.get(source)
+        if ip in results['ips']:
+            metrics.duplicate += 1
+        else:
+            results['ips'].add(ip)
+            metrics.new += 1
+
+    def add_email(self, domain: str, source: str, email: str) -> None:
+        results = self.results_for(domain)
+        results['graph'].link('source', source, 'email', email)
+        unit = CURRENT_UNIT.get()
+        if unit is not None and self.journal is not None:
+            unit.emails.append(email)
+        metrics = self.metrics.get(source)
+        if email in results['emails']:
+            metrics.duplicate += 1
+        else:
+            results['emails'].add(email)
+            metrics.new += 1
+
+    def add_dns(self, domain: str, host: str, ip: str) -> None:
+        # An address a source reported alongside the host
+        results = self.results_for(domain)
+        unit = CURRENT_UNIT.get()
+        if unit is not None and self.journal is not None:
+            unit.pairs.append((host, ip))
+        reported = results['reported'].setdefault(host, [])
+        if ip not in reported:
+            reported.append(ip)
+            results['graph'].link('host', host, 'ip', ip)
+
+    def add_entities(self, domain: str, source: str, entities: Tuple[str, str, str, int]) -> List[str]:
+        # entities is the (hosts, emails, ips, invalid) tuple from extract_entities
+        hosts, emails, ips, invalid = entities
+        for email in emails.split('\n') if emails else []:
+            self.add_email(domain, source, email)
+        for ip in ips.split('\n') if ips else []:
+            self.add_ip(domain, source, ip)
+        return self.add_hosts(domain, source, hosts, invalid)
+
+    @register_source('bing', endpoint='https://www.bing.com',
+                     concurrency=2, rate=1.0, burst=2, retries=2, backoff=2.0)
     async def search_bing(self, domain: str) -> None:
-        url = f"https://www.bing.com/search?q=site:{domain}&count={self.limit}"
-        async with aiohttp.ClientSession() as session:
-            html = await self.fetch(session, url)
-            if html:
-                soup = BeautifulSoup(html, 'html.parser')
-                for link in soup.find_all('a', href=True):
-                    href = link['href']
-                    if domain in href and not href.startswith(('http://webcache.googleusercontent.com')):
-                        self.results['hosts'].add(href)
+        page_size = min(self.limit, BING_PAGE_SIZE)
+        pages = max(1, -(-self.limit // page_size))
+        # Pages are fetched in waves as wide as the source's concurrency cap;
+        # a wave that adds nothing new means the results have run out
+        wave = max(1, SOURCES['bing'].concurrency)
+        seen = set()
+        for first_page in range(0, pages, wave):
+            urls = [
+                f"{self.endpoint('bing')}/search?q=site:{domain}&count={page_size}&first={page * page_size + 1}"
+                for page in range(first_page, min(first_page + wave, pages))
+            ]
+            found = 0
+            for html in await asyncio.gather(*(self.fetch(url, 'bing') for url in urls)):
+                if not html:
+                    continue
+                entities = await self.parse('bing', len(html), parse_bing_page, html, domain)
+                for host in self.add_entities(domain, 'bing', entities):
+                    if host not in seen:
+                        seen.add(host)
+                        found += 1
+            if not found:
+                break
 
+    @register_source('crtsh', endpoint='https://crt.sh',
+                     concurrency=4, rate=1.0, burst=4, retries=3, backoff=5.0, timeout=30.0)
     async def search_crtsh(self, domain: str) -> None:
-        url = f"https://crt.sh/?q=%25.{domain}&output=json"
-        async with aiohttp.ClientSession() as session:
-            response = await self.fetch(session, url)
-            if response:
-                try:
-                    data = json.loads(response)
-                    for item in data:
-                        if item.get('name_value'):
-                            names = item['name_value'].split('\n')
-                            for name in names:
-                                if name and domain in name:
-                                    self.results['hosts'].add(name.strip())
-                except json.JSONDecodeError:
-                    if self.verbose:
-                        print("[-] Error parsing crt.sh response")
+        url = f"{self.endpoint('crtsh')}/?q=%25.{domain}&output=json"
+        # Chunks are scanned in batches; the next batch downloads while the
+        # previous one is being scanned
+        tail = b''
+        batch = bytearray()
+        parsing = None
+        try:
+            async for chunk in self.fetch_stream(url, 'crtsh'):
+                batch += chunk
+                if len(batch) >= self.parse_batch_size:
+                    if parsing is not None:
+                        tail, entities = await parsing
+                        self.add_entities(domain, 'crtsh', entities)
+                    parsing = asyncio.ensure_future(
+                        self.parse('crtsh', len(batch), parse_crtsh_batch, tail, bytes(batch), domain)
+                    )
+                    batch.clear()
+            if parsing is not None:
+                tail, entities = await parsing
+                self.add_entities(domain, 'crtsh', entities)
+                parsing = None
+            _, entities = await self.parse('crtsh', len(batch), parse_crtsh_batch,
+                                           tail, bytes(batch), domain, True)
+            self.add_entities(domain, 'crtsh', entities)
+        finally:
+            if parsing is not None:
+                parsing.cancel()
 
+    @register_source('hackertarget', endpoint='https://api.hackertarget.com',
+                     concurrency=2, rate=0.5, burst=1, retries=3, backoff=5.0)
     async def search_hackertarget(self, domain: str) -> None:
-        url = f"https://api.hackertarget.com/hostsearch/?q={domain}"
-        async with aiohttp.ClientSession() as session:
-            response = await self.fetch(session, url)
-            if response:
-                for line in response.split('\n'):
-                    if ',' in line:
-                        host, ip = line.split(',', 1)
-                        self.results['hosts'].add(host.strip())
-                        self.results['ips'].add(ip.strip())
+        url = f"{self.endpoint('hackertarget')}/hostsearch/?q={domain}"
+        response = await self.fetch(url, 'hackertarget')
+        if response:
+            entities, pairs = await self.parse('hackertarget', len(response), parse_hackertarget,
+                                               response, domain)
+            self.add_entities(domain, 'hackertarget', entities)
+            for pair in pairs.split('\n') if pairs else []:
+                host, ip = pair.split(',', 1)
+                self.add_dns(domain, host, ip)
 
+    @register_source('anubis', endpoint='https://jldc.me',
+                     concurrency=8, rate=5.0, burst=10, retries=3, backoff=1.0)
     async def search_anubis(self, domain: str) -> None:
-        url = f"https://jldc.me/anubis/subdomains/{domain}"
-        async with aiohttp.ClientSession() as session:
-            response = await self.fetch(session, url)
-            if response:
-                try:
-                    data = json.loads(response)
-                    for subdomain in data:
-                        self.results['hosts'].add(subdomain)
-                except json.JSONDecodeError:
-                    if self.verbose:
-                        print("[-] Error parsing Anubis response")
+        url = f"{self.endpoint('anubis')}/anubis/subdomains/{domain}"
+        response = await self.fetch(url, 'anubis')
+        if response:
+            entities = await self.parse('anubis', len(response), parse_anubis, response, domain)
+            self.add_entities(domain, 'anubis', entities)
+
+    def use_source(self, source: str) -> None:
+        if source not in self.sources_used:
+            self.sources_used.append(source)
+
+    async def run_source(self, spec: SourceSpec, domain: str) -> None:
+        if self.journal is not None:
+            replay = self.journal.units.pop((domain, spec.name), None)
+            if replay is not None:
+                self.replay_unit(domain, spec.name, replay)
+                return
+        unit = JournalUnit(domain, spec.name)
+        CURRENT_UNIT.set(unit)
+        metrics = self.metrics.get(spec.name)
+        start = time.monotonic()
+        try:
+            await getattr(self, spec.method)(domain)
+        finally:
+            metrics.searches += 1
+            metrics.search_seconds += time.monotonic() - start
+        if unit.failed:
+            # Kept out of the journal so a resumed run retries it
+            self.failed_sources.setdefault(self.scan_roots.get(domain, domain), set()).add(spec.name)
+        elif self.journal is not None:
+            self.journal.commit_unit(unit)
+
+    def replay_unit(self, domain: str, source: str, lines: List[str]) -> None:
+        # Feeds a journaled unit back through the pipeline instead of searching
+        hosts = []
+        for line in lines:
+            kind, *values = line.rstrip('\n').split('\t')
+            if kind == 'h':
+                hosts.append(values[0])
+            elif kind == 'i':
+                self.add_ip(domain, source, values[0])
+            elif kind == 'e':
+                self.add_email(domain, source, values[0])
+            elif kind == 'a':
+                self.add_dns(domain, *values)
+        self.add_hosts(domain, source, '\n'.join(hosts))
+        if self.verbose:
+            print(f"[*] Resumed {source} results for {domain} from the journal ({len(hosts)} hosts)")
 
     async def run_all_searches(self, domain: str, sources: List[str]) -> None:
         tasks = []
-        if 'bing' in sources:
-            tasks.append(self.search_bing(domain))
-            self.sources_used.append('bing')
-        if 'crtsh' in sources:
-            tasks.append(self.search_crtsh(domain))
-            self.sources_used.append('crtsh')
-        if 'hackertarget' in sources:
-            tasks.append(self.search_hackertarget(domain))
-            self.sources_used.append('hackertarget')
-        if 'anubis' in sources:
-            tasks.append(self.search_anubis(domain))
-            self.sources_used.append('anubis')
+        for name in sources:
+            spec = SOURCES.get(name)
+            if spec is None:
+                print(f"[-] Unknown source: {name}")
+                continue
+            tasks.append(self.run_source(spec, domain))
+            self.use_source(name)
         
         await asyncio.gather(*tasks)
 
-    def generate_report(self, format: str = 'html', filename: str = None) -> None:
+    def emit(self, event: Dict) -> None:
+        if self.event_stream is not None:
+            self.event_stream.write(json.dumps(event) + '\n')
+        for listener in self.listeners:
+            listener(event)
+
+    def should_recurse(self, host: str, domain: str, frontier: set) -> bool:
+        if not self.recursive_depth or len(frontier) > self.max_recursive:
+            return False
+        if host in frontier or host == domain or not in_scope(host, domain):
+            return False
+        # Leave hosts that are scanned in their own right to their own scan
+        if host in self.scan_roots or host in self.pipelines or host in self.domain_results:
+            return False
+        return host.count('.') - domain.count('.') <= self.recursive_depth
+
+    async def scan(self, domain: str, sources: List[str]) -> None:
+        # Sources put new hosts on a queue as they parse them; event output,
+        # DNS resolution and recursive queries consume it while searches run.
+        # Resolved hosts (or every host, without a resolver) go on to probing
+        results = self.results_for(domain)
+        self.queried_sources[domain] = [name for name in sources if name in SOURCES]
+        if self.resolver is not None:
+            self.queried_sources[domain].append(RESOLVER_SOURCE)
+        if self.journal is not None and domain in self.journal.domains:
+            self.journal.restored[domain] = read_interchange(self.journal.domains.pop(domain), results)
+            for name in sources:
+                if name in SOURCES:
+                    self.use_source(name)
+            if self.verbose:
+                print(f"[*] Restored {domain} from the journal ({len(results['hosts'])} hosts)")
+            return
+        found: asyncio.Queue = asyncio.Queue()
+        resolving: asyncio.Queue = asyncio.Queue()
+        probing: asyncio.Queue = asyncio.Queue()
+        frontier = {domain}
+        searches: List[asyncio.Future] = []
+        start = time.monotonic()
+
+        def search(target: str) -> None:
+            if target != domain:
+                self.scan_roots[target] = domain
+            searches.append(asyncio.ensure_future(self.run_all_searches(target, sources)))
+
+        async def discover() -> None:
+            while True:
+                item = await found.get()
+                try:
+                    if item is None:
+                        return
+                    host, source = item
+                    self.emit({'event': 'host', 'domain': domain, 'host': host, 'source': source})
+                    if self.resolver is not None:
+                        resolving.put_nowait(host)
+                    elif self.prober is not None:
+                        probing.put_nowait((host, None))
+                    if self.should_recurse(host, domain, frontier):
+                        frontier.add(host)
+                        if self.verbose:
+                            print(f"[*] Recursing into {host}")
+                        search(host)
+                finally:
+                    found.task_done()
+
+        async def resolve() -> None:
+            while True:
+                host = await resolving.get()
+                if host is None:
+                    return
+                ips = await self.resolver.resolve_into(host, domain, results)
+                if ips:
+                    self.emit({'event': 'dns', 'domain': domain, 'host': host, 'ips': ips})
+                if self.prober is None:
+                    continue
+                if ips:
+                    probing.put_nowait((host, ips))
+                elif host not in results['wildcards']:
+                    # No address, nothing to connect to
+                    results['probes'][host] = ('inactive', '', 0, '', '', 0)
+
+        async def probe() -> None:
+            while True:
+                item = await probing.get()
+                if item is None:
+                    return
+                host, ips = item
+                results['probes'][host] = answer = await self.prober.probe(host, ips)
+                self.emit({'event': 'probe', 'domain': domain, 'host': host, **dict(zip(PROBE_FIELDS, answer))})
+
+        resolvers = self.resolver.concurrency if self.resolver is not None else 0
+        probers = self.prober.concurrency if self.prober is not None else 0
+        workers = [asyncio.ensure_future(discover())]
+        workers += [asyncio.ensure_future(resolve()) for _ in range(resolvers)]
+        probe_workers = [asyncio.ensure_future(probe()) for _ in range(probers)]
+        self.pipelines[domain] = found
+        try:
+            search(domain)
+            # Recursive queries can be started until the last found host has
+            # been consumed, so wait for both the searches and the queue
+            while True:
+                pending = [task for task in searches if not task.done()]
+                if pending:
+                    await asyncio.wait(pending)
+                await found.join()
+                if all(task.done() for task in searches):
+                    break
+            for task in searches:
+                task.result()
+            found.put_nowait(None)
+            for _ in range(resolvers):
+                resolving.put_nowait(None)
+            await asyncio.gather(*workers)
+            # Resolve workers feed the probers, so they stop last
+            for _ in range(probers):
+                probing.put_nowait(None)
+            await asyncio.gather(*probe_workers)
+        finally:
+            for task in workers + probe_workers + searches:
+                task.cancel()
+            del self.pipelines[domain]
+            for target in frontier:
+                if self.scan_roots.get(target) == domain:
+                    del self.scan_roots[target]
+        if self.resolver is not None and self.verbose:
+            print(f"[*] Resolved {len(results['dns'])} of {len(results['hosts'])} hosts for {domain} "
+                  f"in {time.monotonic() - start:.1f}s ({len(results['wildcards'])} wildcard)")
+        if self.prober is not None and self.verbose:
+            active = sum(1 for probe in results['probes'].values() if probe[0] == 'active')
+            print(f"[*] Probed {len(results['probes'])} hosts for {domain}: {active} active "
+                  f"in {time.monotonic() - start:.1f}s")
+
+    async def run_batch(self, domains: List[str], sources: List[str],
+                        on_complete: Optional[Callable[[str], None]] = None) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for domain in domains:
+            queue.put_nowait(domain)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    domain = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # One broken domain must not take the rest of the list with it
+                try:
+                    await self.scan(domain, sources)
+                    if self.verbose:
+                        print(f"[*] Finished {domain} ({len(self.results_for(domain)['hosts'])} hosts)")
+                    if on_complete:
+                        on_complete(domain)
+                except Exception as e:
+                    print(f"[-] Scan of {domain} failed: {str(e) or e.__class__.__name__}")
+                    self.failed_domains.append(domain)
+                    self.failed_sources.pop(domain, None)
+                    self.queried_sources.pop(domain, None)
+                    self.domain_results.pop(domain, None)
+
+        workers = min(self.concurrency, len(domains))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if self.failed_domains:
+            print(f"[-] {len(self.failed_domains)} of {len(domains)} domains failed: "
+                  f"{', '.join(self.failed_domains)}")
+
+    def write_host_pages(self, results: Dict, domain: str, data_dir: str) -> None:
+        os.makedirs(data_dir, exist_ok=True)
+        graph, probes = results['graph'], results['probes']
+        hosts = iter(results['hosts'])
+        page = 0
+        while True:
+            chunk = list(itertools.islice(hosts, self.page_size))
+            if not chunk:
+                break
+            page += 1
+            rows = [
+                [host, 'subdomain' if in_scope(host, domain) else 'external',
+                 ', '.join(graph.neighbours('host', host, 'source')),
+                 [probes[host][0], probe_detail(probes[host])] if host in probes else None]
+                for host in chunk
+            ]
+            with open(os.path.join(data_dir, f"hosts_{page}.js"), 'w') as f:
+                f.write(f"gsitHosts({page}, {json.dumps(rows)});\n")
+
+    def generate_report(self, format: str = 'html', filename: str = None,
+                        domain: Optional[str] = None, results: Optional[Dict] = None,
+                        sources: Optional[List[str]] = None) -> None:
+        domain = domain if domain is not None else self.domain
+        results = results if results is not None else self.results_for(domain)
+        sources = sources if sources is not None else self.sources_used
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"report_{timestamp}.{format}"
+        ipinfo = self.ipdb.annotate(results['ips']) if self.ipdb is not None else {}
 
         if format == 'html':
-            # Enhanced CSS and JS template
-            template_str = """
-            <!DOCTYPE html>
-            <html lang="en">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>GSIT Report for {{ domain }}</title>
-                <style>
-                    :root {
-                        --primary: #1a2b42;
-                        --secondary: #3a5169;
-                        --accent: #d4af37;
-                        --light: #e8e6e3;
-                        --dark: #0d1520;
-                        --success: #4caf50;
-                        --warning: #ff9800;
-                        --danger: #f44336;
-                    }
-                    
-                    body {
-                        font-family: 'Courier New', monospace;
-                        background-color: var(--dark);
-                        color: var(--light);
-                        margin: 0;
-                        padding: 0;
-                        line-height: 1.6;
-                    }
-                    
-                    .container {
-                        max-width: 1200px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }
-                    
-                    header {
-                        background-color: var(--primary);
-                        padding: 20px 0;
-                        border-bottom: 3px solid var(--accent);
-                        margin-bottom: 30px;
-                    }
-                    
-                    h1, h2, h3 {
-                        color: var(--accent);
-                        font-weight: normal;
-                    }
-                    
-                    h1 {
-                        font-size: 2.2rem;
-                        letter-spacing: 1px;
-                        margin: 0;
-                    }
-                    
-                    h2 {
-                        font-size: 1.5rem;
-                        border-bottom: 1px solid var(--secondary);
-                        padding-bottom: 10px;
-                        margin-top: 30px;
-                    }
-                    
-                    .report-meta {
-                        display: flex;
-                        justify-content: space-between;
-                        background-color: var(--primary);
-                        padding: 15px;
-                        margin-bottom: 20px;
-                        border-left: 4px solid var(--accent);
-                    }
-                    
-                    .badge {
-                        display: inline-block;
-                        padding: 3px 8px;
-                        border-radius: 3px;
-                        font-size: 0.8rem;
-                        font-weight: bold;
-                    }
-                    
-                    .badge-success {
-                        background-color: var(--success);
-                        color: white;
-                    }
-                    
-                    .badge-warning {
-                        background-color: var(--warning);
-                        color: black;
-                    }
-                    
-                    .badge-danger {
-                        background-color: var(--danger);
-                        color: white;
-                    }
-                    
-                    table {
-                        width: 100%;
-                        border-collapse: collapse;
-                        margin: 20px 0;
-                        font-size: 0.9rem;
-                    }
-                    
-                    th {
-                        background-color: var(--secondary);
-                        color: var(--accent);
-                        padding: 12px 15px;
-                        text-align: left;
-                        font-weight: normal;
-                        text-transform: uppercase;
-                        letter-spacing: 1px;
-                    }
-                    
-                    td {
-                        padding: 10px 15px;
-                        border-bottom: 1px solid var(--secondary);
-                        vertical-align: top;
-                    }
-                    
-                    tr:hover {
-                        background-color: rgba(58, 81, 105, 0.3);
-                    }
-                    
-                    .section {
-                        background-color: rgba(26, 43, 66, 0.5);
-                        padding: 20px;
-                        margin-bottom: 30px;
-                        border-radius: 5px;
-                        box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2);
-                    }
-                    
-                    .summary-cards {
-                        display: grid;
-                        grid-template-columns: repeat(auto-fill, minmax(250px, 1fr));
-                        gap: 20px;
-                        margin-bottom: 30px;
-                    }
-                    
-                    .card {
-                        background-color: var(--primary);
-                        padding: 20px;
-                        border-radius: 5px;
-                        border-left: 4px solid var(--accent);
-                    }
-                    
-                    .card h3 {
-                        margin-top: 0;
-                        font-size: 1.1rem;
-                    }
-                    
-                    .card-value {
-                        font-size: 1.8rem;
-                        font-weight: bold;
-                        margin: 10px 0;
-                    }
-                    
-                    .filters {
-                        margin-bottom: 20px;
-                        display: flex;
-                        gap: 10px;
-                    }
-                    
-                    .filter-btn {
-                        background-color: var(--secondary);
-                        border: none;
-                        color: var(--light);
-                        padding: 8px 15px;
-                        border-radius: 3px;
-                        cursor: pointer;
-                        transition: all 0.3s;
-                    }
-                    
-                    .filter-btn:hover, .filter-btn.active {
-                        background-color: var(--accent);
-                        color: var(--dark);
-                    }
-                    
-                    .hidden {
-                        display: none;
-                    }
-                    
-                    footer {
-                        text-align: center;
-                        margin-top: 50px;
-                        padding: 20px;
-                        border-top: 1px solid var(--secondary);
-                        font-size: 0.8rem;
-                        color: var(--secondary);
-                    }
-                    
-                    /* Terminal-like elements */
-                    .terminal {
-                        background-color: #0a0a0a;
-                        border: 1px solid var(--accent);
-                        border-radius: 5px;
-                        padding: 15px;
-                        font-family: 'Courier New', monospace;
-                        margin: 20px 0;
-                        overflow-x: auto;
-                    }
-                    
-                    .command-line {
-                        color: var(--accent);
-                    }
-                    
-                    .blinking-cursor {
-                        animation: blink 1s step-end infinite;
-                    }
-                    
-                    @keyframes blink {
-                        from, to { opacity: 1; }
-                        50% { opacity: 0; }
-                    }
-                    
-                    /* Responsive adjustments */
-                    @media (max-width: 768px) {
-                        .summary-cards {
-                            grid-template-columns: 1fr;
-                        }
-                    }
-                </style>
-            </head>
-            <body>
-                <header>
-                    <div class="container">
-                        <h1>GSIT INTELLIGENCE REPORT</h1>
-                    </div>
-                </header>
-                
-                <div class="container">
-                    <div class="report-meta">
-                        <div>
-                            <strong>Target:</strong> {{ domain }}<br>
-                            <strong>Date:</strong> {{ timestamp }}
-                        </div>
-                        <div>
-                            <span class="badge badge-success">CONFIDENTIAL</span>
-                        </div>
-                    </div>
-                    
-                    <div class="summary-cards">
-                        <div class="card">
-                            <h3>Hosts Discovered</h3>
-                            <div class="card-value">{{ hosts|length }}</div>
-                        </div>
-                        <div class="card">
-                            <h3>IP Addresses</h3>
-                            <div class="card-value">{{ ips|length }}</div>
-                        </div>
-                        <div class="card">
-                            <h3>Emails Found</h3>
-                            <div class="card-value">{{ emails|length }}</div>
-                        </div>
-                        <div class="card">
-                            <h3>Data Sources</h3>
-                            <div class="card-value">{{ sources|length }}</div>
-                        </div>
-                    </div>
-                    
-                    <div class="terminal">
-                        <div class="command-line">$ gsit -d {{ domain }} -b {{ sources|join(',') }} -l {{ limit }}<span class="blinking-cursor">_</span></div>
-                    </div>
-                    
-                    <div class="section">
-                        <h2>Host Discovery Results</h2>
-                        <div class="filters">
-                            <button class="filter-btn active" onclick="filterTable('all')">All</button>
-                            <button class="filter-btn" onclick="filterTable('subdomains')">Subdomains</button>
-                            <button class="filter-btn" onclick="filterTable('external')">External</button>
-                        </div>
-                        <table id="hosts-table">
-                            <thead>
-                                <tr>
-                                    <th>Host</th>
-                                    <th>First Seen</th>
-                                    <th>Source</th>
-                                    <th>Status</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                                {% for host in hosts %}
-                                <tr class="{% if '.'+domain in host %}subdomain{% else %}external{% endif %}">
-                                    <td>{{ host }}</td>
-                                    <td>{{ timestamp.split(' ')[0] }}</td>
-                                    <td>{{ sources|random }}</td>
-                                    <td><span class="badge {% if loop.index % 3 == 0 %}badge-success{% elif loop.index % 3 == 1 %}badge-warning{% else %}badge-danger{% endif %}">
-                                        {% if loop.index % 3 == 0 %}Active{% elif loop.index % 3 == 1 %}Unknown{% else %}Inactive{% endif %}
-                                    </span></td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
-                        </table>
-                    </div>
-                    
-                    {% if ips %}
-                    <div class="section">
-                        <h2>IP Addresses</h2>
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th>IP</th>
-                                    <th>Host</th>
-                                    <th>Location</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                                {% for ip in ips %}
-                                <tr>
-                                    <td>{{ ip }}</td>
-                                    <td>{{ hosts|random if hosts else 'N/A' }}</td>
-                                    <td>Unknown</td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
-                        </table>
-                    </div>
-                    {% endif %}
-                    
-                    <div class="section">
-                        <h2>Data Sources Used</h2>
-                        <ul>
-                            {% for source in sources %}
-                            <li>{{ source|upper }}</li>
-                            {% endfor %}
-                        </ul>
-                    </div>
-                    
-                    <footer>
-                        GSIT v1.0 | Generated by Global Search Intelligence Tool | {{ timestamp }}
-                    </footer>
-                </div>
-                
-                <script>
-                    // Table filtering functionality
-                    function filterTable(type) {
-                        const rows = document.querySelectorAll('#hosts-table tbody tr');
-                        const buttons = document.querySelectorAll('.filter-btn');
-                        
-                        buttons.forEach(btn => btn.classList.remove('active'));
-                        event.currentTarget.classList.add('active');
-                        
-                        rows.forEach(row => {
-                            row.style.display = 'table-row';
-                            if (type === 'subdomains' && !row.classList.contains('subdomain')) {
-                                row.style.display = 'none';
-                            } else if (type === 'external' && !row.classList.contains('external')) {
-                                row.style.display = 'none';
-                            }
-                        });
-                    }
-                    
-                    // Sort table functionality
-                    function sortTable(columnIndex) {
-                        const table = document.getElementById('hosts-table');
-                        const rows = Array.from(table.querySelectorAll('tbody tr'));
-                        const header = table.querySelectorAll('thead th')[columnIndex];
-                        const isAsc = header.getAttribute('data-sort') === 'asc';
-                        
-                        // Reset all headers
-                        table.querySelectorAll('thead th').forEach(th => {
-                            th.removeAttribute('data-sort');
-                        });
-                        
-                        // Sort rows
-                        rows.sort((a, b) => {
-                            const aValue = a.cells[columnIndex].textContent;
-                            const bValue = b.cells[columnIndex].textContent;
-                            
-                            if (columnIndex === 3) { // Status column
-                                return isAsc 
-                                    ? aValue.localeCompare(bValue)
-                                    : bValue.localeCompare(aValue);
-                            } else {
-                                return isAsc 
-                                    ? aValue.localeCompare(bValue)
-                                    : bValue.localeCompare(aValue);
-                            }
-                        });
-                        
-                        // Update table
-                        rows.forEach(row => table.tBodies[0].appendChild(row));
-                        
-                        // Update header
-                        header.setAttribute('data-sort', isAsc ? 'desc' : 'asc');
-                    }
-                    
-                    // Make table headers clickable
-                    document.addEventListener('DOMContentLoaded', function() {
-                        const headers = document.querySelectorAll('#hosts-table th');
-                        headers.forEach((header, index) => {
-                            header.style.cursor = 'pointer';
-                            header.addEventListener('click', () => sortTable(index));
-                        });
-                    });
-                </script>
-            </body>
-            </html>
-            """
-            
-            template = Template(template_str)
-            html = template.render(
-                domain=self.domain,
-                hosts=list(self.results['hosts']),
-                ips=list(self.results['ips']),
-                emails=list(self.results['emails']),
-                sources=self.sources_used,
+            template = report_template()
+            host_count = len(results['hosts'])
+            pages = 0
+            data_dir = ''
+            if self.page_size and host_count > self.page_size:
+                pages = -(-host_count // self.page_size)
+                data_dir = os.path.splitext(os.path.basename(filename))[0] + '_data'
+                self.write_host_pages(results, domain, os.path.join(os.path.dirname(filename), data_dir))
+
+            graph = results['graph']
+            netblocks = group_netblocks(ipinfo)
+            # With an IP database the IP table lists addresses netblock by netblock
+            ips = [ip for _, _, group in netblocks for ip in group]
+            ips += [ip for ip in results['ips'] if ip not in ipinfo]
+            probes = results['probes']
+            stream = template.stream(
+                domain=domain,
+                hosts=((host, in_scope(host, domain), graph.neighbours('host', host, 'source'),
+                        probes.get(host))
+                       for host in results['hosts']),
+                probe_detail=probe_detail,
+                host_count=host_count,
+                subdomain_count=results['hosts'].classify(domain)[0],
+                ips=((ip, graph.neighbours('ip', ip, 'host'), ipinfo.get(ip)) for ip in ips),
+                netblocks=netblocks,
+                ip_count=len(results['ips']),
+                email_count=len(results['emails']),
+                sources=sources,
                 limit=self.limit,
+                pages=pages,
+                data_dir=data_dir,
                 timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             )
-            
+            stream.enable_buffering(64)
             with open(filename, 'w') as f:
-                f.write(html)
+                stream.dump(f)
             
             print(f"[+] HTML report generated: {filename}")
         elif format == 'json':
-            report_data = {
-                'domain': self.domain,
-                'date': datetime.now().isoformat(),
-                'results': {
-                    'hosts': list(self.results['hosts']),
-                    'ips': list(self.results['ips']),
-                    'emails': list(self.results['emails']),
-                    'sources': self.sources_used
-                }
-            }
             with open(filename, 'w') as f:
-                json.dump(report_data, f, indent=2)
+                f.write('{\n')
+                f.write(f'  "domain": {json.dumps(domain)},\n')
+                f.write(f'  "date": {json.dumps(datetime.now().isoformat())},\n')
+                f.write('  "results": {\n')
+                for key in ('hosts', 'ips', 'emails'):
+                    f.write(f'    "{key}": ')
+                    write_json_array(f, results[key], '    ')
+                    f.write(',\n')
+                f.write('    "dns": ')
+                write_json_object(f, ((host, host_ips(results, host)) for host in results['hosts']
+                                      if host in results['dns'] or host in results['reported']), '    ')
+                f.write(',\n')
+                # Which sources reported each host, and IPs shared by several hosts
+                graph = results['graph']
+                f.write('    "attribution": ')
+                write_json_object(f, ((host, graph.neighbours('host', host, 'source'))
+                                      for host in results['hosts']), '    ')
+                f.write(',\n')
+                f.write('    "shared_ips": ')
+                write_json_object(f, graph.shared('ip', 'host'), '    ')
+                f.write(',\n')
+                if results['probes']:
+                    f.write('    "probes": ')
+                    write_json_object(f, ((host, dict(zip(PROBE_FIELDS, probe)))
+                                          for host, probe in results['probes'].items()), '    ')
+                    f.write(',\n')
+                if self.ipdb is not None:
+                    f.write('    "ipinfo": ')
+                    write_json_object(f, ((ip, dict(zip(IPDB_FIELDS, info)))
+                                          for ip, info in ipinfo.items()), '    ')
+                    f.write(',\n')
+                    f.write('    "netblocks": ')
+                    write_json_object(f, ((netblock, ips) for netblock, _, ips in group_netblocks(ipinfo)), '    ')
+                    f.write(',\n')
+                f.write('    "scope": ')
+                inside, outside = results['hosts'].classify(domain)
+                f.write(json.dumps({'subdomains': inside, 'external': outside}) + ',\n')
+                f.write('    "sources": ')
+                write_json_array(f, sources, '    ')
+                f.write('\n  }\n}')
             print(f"[+] JSON report generated: {filename}")
+        elif format == 'ndjson':
+            graph = results['graph']
+            with open(filename, 'w') as f:
+                for host in results['hosts']:
+                    record = {'domain': domain, 'type': 'host', 'value': host,
+                              'sources': graph.neighbours('host', host, 'source')}
+                    ips = host_ips(results, host)
+                    if ips:
+                        record['ips'] = ips
+                    if host in results['probes']:
+                        record['probe'] = dict(zip(PROBE_FIELDS, results['probes'][host]))
+                    f.write(json.dumps(record) + '\n')
+                for kind, key in (('ip', 'ips'), ('email', 'emails')):
+                    for value in results[key]:
+                        record = {'domain': domain, 'type': kind, 'value': value,
+                                  'sources': graph.neighbours(kind, value, 'source')}
+                        if value in ipinfo:
+                            record.update(zip(IPDB_FIELDS, ipinfo[value]))
+                        f.write(json.dumps(record) + '\n')
+            print(f"[+] NDJSON report generated: {filename}")
         elif format == 'csv':
-            df = pd.DataFrame({
-                'Host': list(self.results['hosts']),
-                'IP': [', '.join(self.results['ips']) if self.results['ips'] else 'N/A'] * len(self.results['hosts']),
-                'Source': random.choices(self.sources_used, k=len(self.results['hosts']))
-            })
-            df.to_csv(filename, index=False)
+            graph, probes = results['graph'], results['probes']
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Host', 'IP', 'Source'] + (['ASN', 'Org', 'Netblock', 'Country'] if ipinfo else []) +
+                                (['Status', 'URL', 'Code', 'Title', 'Redirect', 'Time (ms)'] if probes else []))
+                for host in results['hosts']:
+                    addresses = host_ips(results, host)
+                    row = [host, ', '.join(addresses) or 'N/A', ', '.join(graph.neighbours('host', host, 'source'))]
+                    if ipinfo:
+                        # One value per distinct answer across the host's IPs
+                        infos = [ipinfo[ip] for ip in addresses if ip in ipinfo]
+                        row += [', '.join(dict.fromkeys(str(info[i]) for info in infos)) for i in range(4)]
+                    if probes:
+                        row += list(probes.get(host, ('unknown', '', '', '', '', '')))
+                    writer.writerow(row)
             print(f"[+] CSV report generated: {filename}")
 
+class ScanJob:
+    def __init__(self, job_id: str, domains: List[str], sources: List[str]):
+        self.id = job_id
+        self.domains = domains
+        self.sources = sources
+        self.status = 'queued'
+        self.error = ''
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.results: Dict[str, Dict] = {}
+        self.diffs: Dict[str, Dict] = {}
+        # Everything published so far; event stream readers replay it and
+        # then wait on `updated` for more
+        self.events: List[Dict] = []
+        self.updated = asyncio.Event()
+
+    def publish(self, event: Dict) -> None:
+        self.events.append(event)
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def merged(self) -> Dict:
+        if len(self.results) == 1:
+            return next(iter(self.results.values()))
+        results = new_results()
+        for domain_results in self.results.values():
+            merge_into(results, domain_results)
+        return results
+
+    def summary(self, gsit: GSIT) -> Dict:
+        hosts = sum(len(results['hosts']) for results in self.results.values())
+        # Domains still being scanned count with what they have found so far
+        hosts += sum(len(gsit.domain_results[domain]['hosts']) for domain in self.domains
+                     if domain not in self.results and domain in gsit.domain_results)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'sources': self.sources,
+            'domains': len(self.domains),
+            'completed': len(self.results),
+            'hosts': hosts,
+            'events': len(self.events),
+            'created': datetime.fromtimestamp(self.created).isoformat(),
+            'started': datetime.fromtimestamp(self.started).isoformat() if self.started else None,
+            'finished': datetime.fromtimestamp(self.finished).isoformat() if self.finished else None,
+            'changes': {
+                domain: {
+                    'added': sum(len(values) for values in diff['added'].values()),
+                    'removed': sum(len(values) for values in diff['removed'].values())
+                } for domain, diff in self.diffs.items()
+            }
+        }
+
+
+class ScanService:
+    # Local HTTP job API around one long-lived GSIT, so the HTTP session,
+    # DNS and response caches, parse pool and compiled report template stay
+    # warm between scans:
+    #   POST /jobs                  {"domains": [...], "engines": "bing,crtsh"}
+    #   GET  /jobs, /jobs/{id}      status and progress
+    #   GET  /jobs/{id}/events      host/dns events as NDJSON, live until done
+    #   GET  /jobs/{id}/report      ?format=json|ndjson|csv|html[&domain=...]
+    #   GET  /jobs/{id}/hosts       ?under=x.example.com, hosts in that subtree
+    #   GET  /metrics               per-source metrics, Prometheus format
+    def __init__(self, gsit: GSIT, sources: List[str], report_dir: str, max_jobs: int = 1000):
+        self.gsit = gsit
+        self.sources = sources
+        self.report_dir = report_dir
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, ScanJob] = {}
+        self.slots = asyncio.Semaphore(gsit.concurrency)
+        # Domain -> job scanning it; a domain is scanned by one job at a
+        # time because results and pipelines are keyed by domain
+        self.scanning: Dict[str, ScanJob] = {}
+        self.scan_done: Dict[str, asyncio.Future] = {}
+        self.tasks: set = set()
+        gsit.listeners.append(self.route)
+
+    def route(self, event: Dict) -> None:
+        job = self.scanning.get(event.get('domain'))
+        if job is not None:
+            job.publish(event)
+
+    def submit(self, domains: List[str], sources: List[str]) -> ScanJob:
+        job = ScanJob(os.urandom(6).hex(), domains, sources)
+        self.jobs[job.id] = job
+        finished = [j for j in self.jobs.values() if j.finished is not None]
+        for old in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[old.id]
+            for name in os.listdir(self.report_dir):
+                if name.startswith(f"job_{old.id}"):
+                    os.remove(os.path.join(self.report_dir, name))
+        task = asyncio.ensure_future(self.run_job(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return job
+
+    async def run_job(self, job: ScanJob) -> None:
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            await asyncio.gather(*(self.scan_domain(job, domain) for domain in job.domains))
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e) or e.__class__.__name__
+            print(f"[-] Job {job.id} failed: {job.error}")
+        else:
+            job.status = 'done'
+        job.finished = time.time()
+        if self.gsit.resolver is not None:
+            self.gsit.resolver.prune()
+        # Jobs are often small; rows are written out in batches, not per job
+        if self.gsit.history is not None and self.gsit.history.due():
+            self.gsit.history.flush()
+        job.publish({'event': 'status', 'status': job.status})
+        if self.gsit.verbose:
+            print(f"[*] Job {job.id} {job.status} in {job.finished - job.started:.1f}s")
+
+    async def scan_domain(self, job: ScanJob, domain: str) -> None:
+        async with self.slots:
+            while domain in self.scan_done:
+                await asyncio.wait([self.scan_done[domain]])
+            done = asyncio.get_running_loop().create_future()
+            self.scan_done[domain] = done
+            self.scanning[domain] = job
+            try:
+                await self.gsit.scan(domain, job.sources)
+                diff = self.gsit.record(domain)
+                if diff is not None:
+                    job.diffs[domain] = diff
+            finally:
+                job.results[domain] = self.gsit.domain_results.pop(domain, None) or new_results()
+                del self.scanning[domain]
+                del self.scan_done[domain]
+                done.set_result(None)
+        job.publish({'event': 'domain', 'domain': domain, 'hosts': len(job.results[domain]['hosts'])})
+
+    def job_or_404(self, request) -> ScanJob:
+        job = self.jobs.get(request.match_info['id'])
+        if job is None:
+            raise aiohttp.web.HTTPNotFound(text=json.dumps({'error': 'unknown job'}),
+                                           content_type='application/json')
+        return job
+
+    async def create_job(self, request):
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return aiohttp.web.json_response({'error': 'invalid JSON body'}, status=400)
+        if not isinstance(body, dict):
+            return aiohttp.web.json_response({'error': 'expected a JSON object'}, status=400)
+        domains = body.get('domains') or body.get('domain') or []
+        if isinstance(domains, str):
+            domains = domains.split(',')
+        if not isinstance(domains, list) or not all(isinstance(d, str) for d in domains):
+            return aiohttp.web.json_response({'error': 'domains must be a string or a list of strings'},
+                                             status=400)
+        domains = [d.strip() for d in domains if d.strip()]
+        # Names end up in report file names, so only canonical hosts get in
+        invalid = [d for d in domains if normalize_domain(d) is None]
+        if invalid:
+            return aiohttp.web.json_response({'error': f"invalid domains: {', '.join(invalid)}"}, status=400)
+        domains = list(dict.fromkeys(normalize_domain(d) for d in domains))
+        if not domains:
+            return aiohttp.web.json_response({'error': 'no domains given'}, status=400)
+        sources = body.get('engines') or self.sources
+        if isinstance(sources, str):
+            sources = [e.strip() for e in sources.split(',')]
+        if not isinstance(sources, list) or not all(isinstance(e, str) for e in sources):
+            return aiohttp.web.json_response({'error': 'engines must be a string or a list of strings'},
+                                             status=400)
+        unknown = [name for name in sources if name not in SOURCES]
+        if unknown:
+            return aiohttp.web.json_response({'error': f"unknown engines: {', '.join(unknown)}"}, status=400)
+        job = self.submit(domains, sources)
+        return aiohttp.web.json_response(job.summary(self.gsit), status=202)
+
+    async def list_jobs(self, request):
+        return aiohttp.web.json_response([job.summary(self.gsit) for job in self.jobs.values()])
+
+    async def get_job(self, request):
+        return aiohttp.web.json_response(self.job_or_404(request).summary(self.gsit))
+
+    async def job_events(self, request):
+        job = self.job_or_404(request)
+        response = aiohttp.web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        sent = 0
+        while True:
+            updated = job.updated
+            if sent < len(job.events):
+                events = job.events[sent:]
+                sent += len(events)
+                await response.write(''.join(json.dumps(event) + '\n' for event in events).encode())
+            if job.finished is not None and sent == len(job.events):
+                break
+            await updated.wait()
+        await response.write_eof()
+        return response
+
+    async def job_report(self, request):
+        job = self.job_or_404(request)
+        format = request.query.get('format', 'json')
+        if format not in ('json', 'ndjson', 'csv', 'html'):
+            return aiohttp.web.json_response({'error': f"unsupported format: {format}"}, status=400)
+        if job.finished is None:
+            return aiohttp.web.json_response({'error': f"job is {job.status}"}, status=409)
+        domain = request.query.get('domain')
+        if domain is not None and domain not in job.results:
+            return aiohttp.web.json_response({'error': f"domain not in job: {domain}"}, status=404)
+        # Finished jobs never change, so each report is rendered once
+        name = f"job_{job.id}_{domain}.{format}" if domain else f"job_{job.id}.{format}"
+        filename = os.path.join(self.report_dir, name)
+        if not os.path.exists(filename):
+            if domain:
+                results = job.results[domain]
+            else:
+                domain = job.domains[0] if len(job.domains) == 1 else f"{len(job.domains)} domains"
+                results = job.merged()
+            self.gsit.generate_report(format, filename, domain=domain, results=results,
+                                      sources=job.sources)
+        return aiohttp.web.FileResponse(filename)
+
+    async def job_hosts(self, request):
+        job = self.job_or_404(request)
+        under = request.query.get('under', '')
+        if normalize_host(under) is None:
+            return aiohttp.web.json_response({'error': f"invalid host: {under}"}, status=400)
+        # Domains still being scanned answer with what they have so far
+        hosts = []
+        for domain in job.domains:
+            results = job.results.get(domain) or self.gsit.domain_results.get(domain)
+            if results is not None:
+                hosts.extend(results['hosts'].under(under))
+        return aiohttp.web.json_response({'under': under, 'hosts': hosts})
+
+    async def get_metrics(self, request):
+        return aiohttp.web.Response(text=self.gsit.metrics.prometheus(),
+                                    content_type='text/plain', charset='utf-8')
+
+    async def serve(self, host: str, port: int) -> None:
+        import aiohttp.web
+        os.makedirs(self.report_dir, exist_ok=True)
+        # Warm the template cache now instead of on the first HTML report
+        report_template()
+        app = aiohttp.web.Application()
+        app.router.add_post('/jobs', self.create_job)
+        app.router.add_get('/jobs', self.list_jobs)
+        app.router.add_get('/jobs/{id}', self.get_job)
+        app.router.add_get('/jobs/{id}/events', self.job_events)
+        app.router.add_get('/jobs/{id}/report', self.job_report)
+        app.router.add_get('/jobs/{id}/hosts', self.job_hosts)
+        app.router.add_get('/metrics', self.get_metrics)
+        runner = aiohttp.web.AppRunner(app)
+        await runner.setup()
+        try:
+            await aiohttp.web.TCPSite(runner, host, port).start()
+            print(f"[*] Serving scan jobs on http://{host}:{port}")
+            await asyncio.Event().wait()
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
+            await runner.cleanup()
+
+
+def write_diff(diff: Dict, stream) -> None:
+    stream.write(json.dumps(diff) + '\n')
+    added = sum(len(values) for values in diff['added'].values())
+    removed = sum(len(values) for values in diff['removed'].values())
+    print(f"[+] {diff['domain']}: {added} new, {removed} disappeared since last scan"
+          + (f" (removals skipped, failed: {', '.join(diff['failed_sources'])})"
+             if diff.get('failed_sources') else ''))
+
+def parse_ttl(spec: str) -> Dict[str, int]:
+    ttl = {}
+    for item in spec.split(','):
+        if '=' in item:
+            source, seconds = item.split('=', 1)
+            ttl[source.strip()] = int(seconds)
+    return ttl
+
 async def main():
     parser = argparse.ArgumentParser(description="GSIT - Global Search Intelligence Tool")
-    parser.add_argument("-d", "--domain", required=True, help="Target domain to search")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("-d", "--domain", help="Target domain to search")
+    target.add_argument("-i", "--input", help="File with one domain per line ('-' for stdin)")
+    target.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="Run as a local service accepting scan jobs over HTTP")
     parser.add_argument("-b", "--engines", default="bing,crtsh,hackertarget,anubis",
                        help="Comma-separated list of search engines to use")
     parser.add_argument("-l", "--limit", type=int, default=100,
@@ -555,24 +3718,378 @@ async def main():
     parser.add_argument("-v", "--verbose", action="store_true",
                        help="Show verbose output")
     parser.add_argument("-f", "--output", help="Output file name")
-    parser.add_argument("--format", choices=["json", "html", "csv"], default="html",
+    parser.add_argument("--format", choices=["json", "ndjson", "html", "csv"], default="html",
                        help="Output format (default: html)")
+    parser.add_argument("--page-size", type=int, default=0,
+                       help="Split the HTML host table into lazily loaded pages of N hosts")
+    parser.add_argument("--concurrency", type=int, default=20,
+                       help="Maximum domains scanned at once in batch mode (default: 20)")
+    parser.add_argument("--merge", action="store_true",
+                       help="Write one merged report for a batch instead of one per domain")
+    parser.add_argument("--output-dir", default=".",
+                       help="Directory for per-domain batch reports and service job reports (default: .)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                       help=f"Response cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=512,
+                       help="Maximum response cache size in MB (default: 512)")
+    parser.add_argument("--cache-ttl", default="",
+                       help="Per-source cache TTL in seconds, e.g. crtsh=86400,bing=3600")
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument("--no-cache", action="store_true",
+                            help="Disable the response cache")
+    cache_mode.add_argument("--cache-only", action="store_true",
+                            help="Serve responses from the cache only, never the network")
+    cache_mode.add_argument("--refresh", action="store_true",
+                            help="Ignore cached responses and refetch everything")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                       help=f"Result history database (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument("--no-store", action="store_true",
+                       help="Do not record results in the history database")
+    parser.add_argument("--history", nargs='?', const=DEFAULT_HISTORY_DIR, metavar="DIR",
+                       help=f"Append results to a columnar scan history, needs pyarrow "
+                            f"(default DIR: {DEFAULT_HISTORY_DIR})")
+    parser.add_argument("--journal", metavar="FILE",
+                       help="Checkpoint finished work to FILE so an interrupted run can be "
+                            "resumed; removed when the run completes")
+    parser.add_argument("--resume", action="store_true",
+                       help="Continue an interrupted run from its journal, skipping finished work "
+                            "(default journal: gsit.journal in --output-dir)")
+    # Set for shard workers, which journal to their own file
+    parser.set_defaults(shard=None)
+    parser.add_argument("--query", choices=HISTORY_QUERIES,
+                       help="Answer a question from the scan history instead of scanning "
+                            "(-d filters by domain, --since by time)")
+    parser.add_argument("--since", default="7d",
+                       help="Time window for --query: 7d, 12h or an ISO date (default: 7d)")
+    parser.add_argument("--diff", action="store_true",
+                       help="Write only new and disappeared entities since the last scan (NDJSON)")
+    parser.add_argument("--resolve", action="store_true",
+                       help="Resolve discovered hosts (A/AAAA/CNAME) as they are found")
+    parser.add_argument("--resolvers", default="",
+                       help="Comma-separated nameservers, e.g. 1.1.1.1,127.0.0.1:5353 "
+                            "(default: /etc/resolv.conf)")
+    parser.add_argument("--dns-concurrency", type=int, default=500,
+                       help="Maximum DNS lookups in flight (default: 500)")
+    parser.add_argument("--ipdb", metavar="FILE",
+                       help="Local ASN/geo range database (iptoasn TSV, CSV or .mmdb) to "
+                            "annotate IPs with ASN, org, netblock and country")
+    parser.add_argument("--probe", action="store_true",
+                       help="Check discovered hosts with TCP connect and HTTP(S) HEAD requests")
+    parser.add_argument("--probe-concurrency", type=int, default=200,
+                       help="Maximum hosts probed at once (default: 200)")
+    parser.add_argument("--probe-timeout", type=float, default=5.0,
+                       help="Upper bound in seconds for each connect and request (default: 5)")
+    parser.add_argument("--probe-ports", default="443,80",
+                       help="Ports tried in order, PORT[/SCHEME] (default: 443,80)")
+    parser.add_argument("--recursive", type=int, default=0, metavar="DEPTH",
+                       help="Query the sources again for subdomains up to DEPTH labels below the target")
+    parser.add_argument("--max-recursive", type=int, default=100,
+                       help="Maximum recursive queries per domain (default: 100)")
+    parser.add_argument("--stream",
+                       help="Append host and DNS events to this NDJSON file as they are discovered")
+    parser.add_argument("--metrics",
+                       help="Write a JSON summary of per-source performance metrics to this file")
+    parser.add_argument("--prometheus",
+                       help="Write per-source metrics in Prometheus text format to this file")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                       help="Parse large responses in a pool of N workers (default: 0, on the event loop)")
+    parser.add_argument("--parse-mode", choices=["process", "thread"], default="process",
+                       help="Worker pool type for --parse-workers (default: process)")
+    parser.add_argument("--endpoints", default="",
+                       help="Per-source base URL overrides, e.g. crtsh=http://127.0.0.1:8080")
+    parser.add_argument("--shards", type=int, default=1,
+                       help="Split a domain list across N worker processes (default: 1)")
+    parser.add_argument("--connections", type=int, default=100,
+                       help="Maximum pooled HTTP connections (default: 100)")
+    parser.add_argument("--per-host", type=int, default=10,
+                       help="Maximum pooled HTTP connections per host (default: 10)")
 
     args = parser.parse_args()
+    if args.domain:
+        # Responses are matched against the lowercase ASCII (IDNA) form
+        domain = normalize_domain(args.domain)
+        if domain is None:
+            parser.error(f"invalid domain: {args.domain}")
+        args.domain = domain
+    if args.query:
+        run_query_mode(args)
+        return
+    if not (args.domain or args.input or args.serve):
+        parser.error("one of -d/--domain, -i/--input, --serve or --query is required")
+    if args.diff and args.no_store:
+        parser.error("--diff needs the history database; drop --no-store")
+    if args.shards > 1 and not args.input:
+        parser.error("--shards needs a domain list (-i)")
+    if (args.journal or args.resume) and args.serve:
+        parser.error("--journal and --resume are for domain and batch runs")
+    # Journaling is opt-in: a fresh run truncates its journal, so two runs
+    # sharing a default file would wipe each other's checkpoints
+    if args.resume and not args.journal:
+        args.journal = os.path.join(args.output_dir, 'gsit.journal')
+
+    gsit = configure(args)
+    sources = [e.strip() for e in args.engines.split(',')]
+
+    if args.stream:
+        # Line buffered so consumers tailing the file see each event at once
+        gsit.event_stream = open(args.stream, 'a', buffering=1)
 
+    try:
+        if args.serve:
+            await run_service_mode(gsit, args, sources)
+        elif args.input:
+            await run_batch_mode(gsit, args, sources)
+        else:
+            await run_single_mode(gsit, args, sources)
+        if gsit.journal is not None:
+            gsit.journal.remove()
+    finally:
+        if gsit.journal is not None:
+            gsit.journal.close()
+        if gsit.event_stream is not None:
+            gsit.event_stream.close()
+        if gsit.history is not None:
+            gsit.history.close()
+        if args.metrics:
+            gsit.metrics.write_json(args.metrics)
+        if args.prometheus:
+            gsit.metrics.write_prometheus(args.prometheus)
+
+def configure(args: argparse.Namespace) -> GSIT:
     gsit = GSIT()
-    gsit.domain = args.domain
     gsit.verbose = args.verbose
     gsit.limit = args.limit
+    gsit.page_size = args.page_size
+    gsit.parse_workers = args.parse_workers
+    gsit.parse_mode = args.parse_mode
+    gsit.concurrency = args.concurrency
+    gsit.max_connections = args.connections
+    gsit.max_connections_per_host = args.per_host
+    for item in args.endpoints.split(','):
+        if '=' in item:
+            source, url = item.split('=', 1)
+            gsit.endpoints[source.strip()] = url.strip().rstrip('/')
+    gsit.recursive_depth = args.recursive
+    gsit.max_recursive = args.max_recursive
+    if not args.no_cache:
+        gsit.cache = ResponseCache(
+            args.cache_dir,
+            max_bytes=args.cache_size << 20,
+            ttl=parse_ttl(args.cache_ttl),
+            mode='only' if args.cache_only else 'refresh' if args.refresh else 'normal'
+        )
+    if not args.no_store:
+        gsit.store = ResultStore(args.store)
+    if args.journal:
+        gsit.journal = ScanJournal(args.journal, resume=args.resume, shard=args.shard)
+        if args.resume:
+            print(f"[*] Resuming from {args.journal}: {len(gsit.journal.domains)} domains and "
+                  f"{len(gsit.journal.units)} source queries already done")
+    if args.history:
+        try:
+            gsit.history = HistoryStore(args.history)
+        except ImportError:
+            print("[-] pyarrow is not installed; scan history is not recorded")
+    if args.ipdb:
+        start = time.monotonic()
+        gsit.ipdb = IPDatabase(args.ipdb)
+        if args.verbose:
+            print(f"[*] Loaded {len(gsit.ipdb)} IP ranges from {args.ipdb} "
+                  f"in {time.monotonic() - start:.1f}s")
+    if args.resolve:
+        gsit.resolver = DNSResolver(
+            [ns.strip() for ns in args.resolvers.split(',') if ns.strip()],
+            concurrency=args.dns_concurrency
+        )
+    if args.probe:
+        ports = parse_probe_ports(args.probe_ports)
+        # A probe holds one raw connect per port plus a session connection;
+        # the rest of the process (HTTP pool, DNS, databases) keeps a reserve
+        per_probe = len(ports) + 1
+        reserved = args.connections + 64
+        limit = raise_fd_limit(reserved + args.probe_concurrency * per_probe)
+        concurrency = max(1, min(args.probe_concurrency, (limit - reserved) // per_probe))
+        if concurrency < args.probe_concurrency:
+            print(f"[-] The open file limit is {limit}; probing {concurrency} hosts at a time "
+                  f"instead of {args.probe_concurrency}")
+        gsit.prober = HostProber(
+            concurrency=concurrency,
+            timeout=args.probe_timeout,
+            ports=ports,
+            user_agent=gsit.user_agent
+        )
+    return gsit
 
-    sources = [e.strip() for e in args.engines.split(',')]
+def run_query_mode(args: argparse.Namespace) -> None:
+    try:
+        history = HistoryStore(args.history or DEFAULT_HISTORY_DIR)
+    except ImportError:
+        sys.exit("[-] --query needs pyarrow (pip install pyarrow)")
+    answer = history.query(args.query, domain=args.domain, since=parse_since(args.since))
+    if 'domains' in answer:
+        answer['domains'] = answer['domains'].map(' '.join)
+    output = args.output or sys.stdout
+    if args.format == 'json':
+        answer.to_json(output, orient='records', date_format='iso', indent=2)
+    elif args.format == 'ndjson':
+        answer.to_json(output, orient='records', date_format='iso', lines=True)
+    else:
+        answer.to_csv(output, index=False)
+    if args.output:
+        print(f"[+] {len(answer)} rows written: {args.output}")
+
+async def run_service_mode(gsit: GSIT, args: argparse.Namespace, sources: List[str]) -> None:
+    host, _, port = args.serve.rpartition(':')
+    # Served HTML reports are single files, so host tables are never paged
+    gsit.page_size = 0
+    service = ScanService(gsit, sources, os.path.join(args.output_dir, 'jobs'))
+    async with gsit:
+        await service.serve(host or '127.0.0.1', int(port))
+
+async def run_single_mode(gsit: GSIT, args: argparse.Namespace, sources: List[str]) -> None:
+    gsit.domain = args.domain
     print(f"[*] Searching {args.domain} using: {', '.join(sources)}")
 
-    await gsit.run_all_searches(args.domain, sources)
+    async with gsit:
+        await gsit.scan(args.domain, sources)
+
+    diff = gsit.record(args.domain)
+    if args.diff:
+        output_file = args.output or f"diff_{args.domain}_{datetime.now().strftime('%Y%m%d')}.ndjson"
+        with open(output_file, 'w') as f:
+            write_diff(diff, f)
+        return
 
     output_file = args.output or f"report_{args.domain}_{datetime.now().strftime('%Y%m%d')}.{args.format}"
     gsit.generate_report(args.format, output_file)
 
+def finish_domain_output(gsit: GSIT, args: argparse.Namespace, domain: str, date: str,
+                         diff: Optional[Dict]) -> None:
+    # Per-domain batch output; merged output is handled by the caller
+    if args.diff:
+        with open(os.path.join(args.output_dir, f"diff_{domain}_{date}.ndjson"), 'w') as f:
+            write_diff(diff, f)
+    else:
+        output_file = os.path.join(args.output_dir, f"report_{domain}_{date}.{args.format}")
+        gsit.generate_report(args.format, output_file, domain=domain)
+
+def run_shard(args: argparse.Namespace, sources: List[str], domains: List[str],
+              export_path: str, date: str) -> Metrics:
+    # Worker process entry point: its own GSIT, event loop and session pool.
+    # Each worker takes its share of the per-source rates and shares the
+    # concurrency caps with the others, so the shards together respect them
+    for spec in SOURCES.values():
+        spec.rate /= args.shards
+    gsit = configure(args)
+    gsit.shared_slots = SHARD_SLOTS
+    if args.stream:
+        gsit.event_stream = open(args.stream, 'a', buffering=1)
+    try:
+        asyncio.run(run_shard_batch(gsit, args, sources, domains, export_path, date))
+    finally:
+        if gsit.journal is not None:
+            gsit.journal.close()
+    if gsit.history is not None:
+        gsit.history.close()
+    return gsit.metrics
+
+async def run_shard_batch(gsit: GSIT, args: argparse.Namespace, sources: List[str],
+                          domains: List[str], export_path: str, date: str) -> None:
+    with open(export_path, 'w') as export:
+        def finish_domain(domain: str) -> None:
+            diff = gsit.record(domain)
+            if args.merge and args.diff:
+                export.write(f"d\t{json.dumps(diff)}\n")
+            elif args.merge:
+                write_interchange(export, gsit.results_for(domain))
+            else:
+                finish_domain_output(gsit, args, domain, date, diff)
+            gsit.domain_results.pop(domain, None)
+
+        try:
+            async with gsit:
+                await gsit.run_batch(domains, sources, finish_domain)
+        finally:
+            if gsit.event_stream is not None:
+                gsit.event_stream.close()
+
+async def run_sharded(gsit: GSIT, args: argparse.Namespace, sources: List[str],
+                      domains: List[str], date: str) -> None:
+    # Domains are dealt round-robin to worker processes; merged output is
+    # rebuilt here from the interchange files they write
+    shards = [domains[i::args.shards] for i in range(args.shards) if domains[i::args.shards]]
+    print(f"[*] Scanning in {len(shards)} worker processes")
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryDirectory(prefix='gsit-shards-') as workdir:
+        paths = [os.path.join(workdir, f"shard_{i}.tsv") for i in range(len(shards))]
+        # spawn, not fork: the parent already runs an event loop
+        context = multiprocessing.get_context('spawn')
+        slots = {name: context.BoundedSemaphore(spec.concurrency) for name, spec in SOURCES.items()}
+        with concurrent.futures.ProcessPoolExecutor(len(shards), mp_context=context,
+                                                    initializer=init_shard_worker,
+                                                    initargs=(slots,)) as pool:
+            # Each worker appends to its own journal file, <journal>.shard-N
+            for metrics in await asyncio.gather(*(
+                loop.run_in_executor(pool, run_shard, argparse.Namespace(**{**vars(args), 'shard': i}),
+                                     sources, shard, path, date)
+                for i, (shard, path) in enumerate(zip(shards, paths))
+            )):
+                gsit.metrics.merge(metrics)
+        if not args.merge:
+            return
+        diffs = []
+        for path in paths:
+            with open(path) as f:
+                diffs += read_interchange(f, gsit.results)
+    if args.diff:
+        with open(args.output or f"diff_batch_{date}.ndjson", 'w') as f:
+            for diff in diffs:
+                write_diff(diff, f)
+        return
+    # The searches ran in the workers, so the parent never saw use_source
+    gsit.sources_used = list(sources)
+    gsit.domain = f"{len(domains)} domains"
+    output_file = args.output or f"report_batch_{date}.{args.format}"
+    gsit.generate_report(args.format, output_file)
+
+async def run_batch_mode(gsit: GSIT, args: argparse.Namespace, sources: List[str]) -> None:
+    domains = read_domains(args.input)
+    print(f"[*] Searching {len(domains)} domains using: {', '.join(sources)}")
+    date = datetime.now().strftime('%Y%m%d')
+    if not args.merge:
+        os.makedirs(args.output_dir, exist_ok=True)
+    if args.shards > 1:
+        await run_sharded(gsit, args, sources, domains, date)
+        return
+
+    merged_diff = None
+
+    def finish_domain(domain: str) -> None:
+        diff = gsit.record(domain)
+        if args.diff and args.merge:
+            write_diff(diff, merged_diff)
+        elif not args.merge:
+            finish_domain_output(gsit, args, domain, date, diff)
+        if not args.merge or args.diff:
+            # Output is written as domains finish, so drop their results
+            gsit.domain_results.pop(domain, None)
+
+    if args.merge and args.diff:
+        merged_diff = open(args.output or f"diff_batch_{date}.ndjson", 'w')
+
+    try:
+        async with gsit:
+            await gsit.run_batch(domains, sources, finish_domain)
+    finally:
+        if merged_diff:
+            merged_diff.close()
+
+    if args.merge and not args.diff:
+        gsit.domain = f"{len(domains)} domains"
+        gsit.merge_results()
+        output_file = args.output or f"report_batch_{date}.{args.format}"
+        gsit.generate_report(args.format, output_file)
+
 if __name__ == "__main__":
     asyncio.run(main())
 